@@ -0,0 +1,70 @@
+# coding: utf-8
+"""
+batch.py
+
+Rank whole arrays of hands at once with numpy. Hands are rows of card ints
+(see poker.card_to_int) in an (N, 5), (N, 6) or (N, 7) integer array, and the
+result is an N length array of ranks, identical to what hand_build would give
+each row. There's no per hand python code, everything is done with table
+lookups over the whole array, using the same tables as lookup.py.
+
+Descriptions and the 5 card hands are only built for the rows you ask for,
+with describe().
+
+>>> cards = numpy.array([[12, 25, 38, 51, 0], [0, 1, 2, 3, 4]])
+>>> rank(cards)
+array([3145740, 2661052], dtype=int32)
+>>> describe(cards, [1])[0].desc
+'straight flush'
+"""
+
+import numpy
+import poker
+import lookup
+
+# rank for each 13-bit suit mask that makes a flush, 0 for everything else.
+FLUSH_TABLE = numpy.zeros(0x2000, dtype=numpy.int32)
+for mask, r in lookup.FLUSHES.iteritems():
+    FLUSH_TABLE[mask] = r
+
+# non-flush ranks, sorted by value key so they can be found with searchsorted.
+KEYS = numpy.array(sorted(lookup.RANKS), dtype=numpy.uint64)
+KEY_RANKS = numpy.array([lookup.RANKS[k] for k in sorted(lookup.RANKS)], dtype=numpy.int32)
+
+# per card int lookups
+CARD_KEYS = numpy.array([lookup.VALUE_KEYS[c.value] for c in poker.CARDS], dtype=numpy.uint64)
+CARD_BITS = numpy.array(lookup.BITS, dtype=numpy.uint64)
+
+def rank(cards):
+    """
+    Rank every row of an (N, 5..7) array of card ints. Returns an int32 array
+    of N ranks, lower is better. Rows must not contain duplicate cards.
+    """
+    cards = numpy.asarray(cards, dtype=numpy.intp)
+    assert cards.ndim == 2 and 5 <= cards.shape[1] <= 7
+
+    keys = CARD_KEYS[cards].sum(axis=1, dtype=numpy.uint64)
+    ranks = KEY_RANKS[numpy.searchsorted(KEYS, keys)]
+
+    # a 7 card hand can only have one flush suit, and a flush beats anything
+    # the value table could give us.
+    masks = numpy.bitwise_or.reduce(CARD_BITS[cards], axis=1)
+    for suit in range(4):
+        suited = (masks >> numpy.uint64(13 * suit)) & numpy.uint64(0x1FFF)
+        flush = FLUSH_TABLE[suited.astype(numpy.intp)]
+        ranks = numpy.where(flush, flush, ranks)
+
+    return ranks
+
+def describe(cards, rows):
+    """
+    Build the full Hand (rank, cards, desc) for the given rows of a card
+    array, using hand_build.
+    """
+    return [poker.hand_build([poker.CARDS[c] for c in cards[r]]) for r in rows]
+
+def from_cards(hands):
+    """
+    Convert a list of Card lists (all the same length) into a card int array.
+    """
+    return numpy.array([[poker.card_to_int(c) for c in h] for h in hands], dtype=numpy.int8)
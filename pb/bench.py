@@ -0,0 +1,179 @@
+"""
+bench.py
+
+Benchmarks for the hand evaluator and the game's hot paths. Every benchmark
+works through inputs dealt from a fixed seed, so runs are comparable, and is
+timed a few times over keeping the best. Results are in operations (hands,
+decks or showdowns) per second, and can be saved as JSON and compared against
+a saved baseline: compare fails if anything has slowed down by more than the
+threshold.
+
+    python bench.py                         print results
+    python bench.py save baseline.json      print and save them
+    python bench.py compare baseline.json [threshold]
+                                            print them, exit 1 if slower
+"""
+
+import gc
+import json
+import random
+import time
+import poker
+import game
+
+# each benchmark runs over this many inputs, best of REPEAT runs.
+COUNT = 20000
+REPEAT = 5
+# fraction slower than the baseline that fails compare.
+THRESHOLD = 0.1
+
+
+def deals(n, size, seed=0):
+    rng = random.Random(seed)
+    return [rng.sample(poker.CARDS, size) for i in range(n)]
+
+def bench_hand_build(size):
+    hands = deals(COUNT, size)
+    def run():
+        for cards in hands:
+            # hand_build uses up the list it's given.
+            poker.hand_build(list(cards))
+    return run, len(hands)
+
+def bench_hand_build_omaha():
+    hands = [(c[:4], c[4:]) for c in deals(COUNT / 10, 9)]
+    def run():
+        for hole, board in hands:
+            poker.hand_build_omaha(hole, board)
+    return run, len(hands)
+
+def bench_chk_straight():
+    hands = deals(COUNT, 7)
+    def run():
+        for cards in hands:
+            poker.chk_straight(list(cards))
+    return run, len(hands)
+
+def bench_deck():
+    """
+    a fresh deck and a full table's worth of cards from it.
+    """
+    rng = random.Random(0)
+    def run():
+        for i in range(COUNT):
+            d = poker.deck(rng)
+            for n in range(15):
+                d.next()
+    return run, COUNT
+
+def bench_deck_reset():
+    """
+    the same with one Deck, reset every time.
+    """
+    d = poker.Deck(random.Random(0))
+    def run():
+        for i in range(COUNT):
+            d.reset()
+            d.deal(15)
+    return run, COUNT
+
+def bench_showdown():
+    """
+    showdowns at a full table, from hands dealt and drawn before timing.
+    """
+    random.seed(0)
+    g = game.Game()
+    g.output = lambda msg, urgent: None
+    hands = []
+    for i in range(COUNT / 10):
+        # a fixed seed per hand, so every run times the same showdowns.
+        g.deck.reset(i)
+        g.board = []
+        for p in g.players:
+            p.folded = p.allin = False
+        g.deal()
+        for r in g.rounds[1:]:
+            g.draw(r)
+        hands.append((g.board, [(p.cards, p.mask, p.rank) for p in g.players]))
+
+    def run():
+        for board, players in hands:
+            g.board = board
+            g.pot = 0
+            for p, (cards, mask, rank) in zip(g.players, players):
+                p.cards, p.mask, p.rank, p.hand = cards, mask, rank, None
+                p.total_bet = 30
+                g.pot += 30
+            g.showdown()
+    return run, len(hands)
+
+BENCHMARKS = [
+    ('hand_build_5', lambda: bench_hand_build(5)),
+    ('hand_build_6', lambda: bench_hand_build(6)),
+    ('hand_build_7', lambda: bench_hand_build(7)),
+    ('hand_build_omaha', bench_hand_build_omaha),
+    ('chk_straight', bench_chk_straight),
+    ('deck', bench_deck),
+    ('deck_reset', bench_deck_reset),
+    ('showdown', bench_showdown),
+]
+
+
+def run_all():
+    """
+    Run every benchmark, returning a dict of name -> operations per second.
+    """
+    results = {}
+    for name, setup in BENCHMARKS:
+        run, ops = setup()
+        best = None
+        # like timeit, keep the garbage collector out of the timings.
+        gc.disable()
+        try:
+            for i in range(REPEAT):
+                start = time.time()
+                run()
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+        finally:
+            gc.enable()
+        results[name] = ops / best
+    return results
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    The benchmarks that are slower than the baseline by more than threshold,
+    as a list of (name, ops/s, baseline ops/s).
+    """
+    slower = []
+    for name, ops in sorted(results.items()):
+        base = baseline.get(name)
+        if base and ops < base * (1 - threshold):
+            slower.append((name, ops, base))
+    return slower
+
+
+if __name__ == '__main__':
+    import sys
+    results = run_all()
+    baseline = {}
+    if len(sys.argv) > 2 and sys.argv[1] == 'compare':
+        with open(sys.argv[2]) as f:
+            baseline = json.load(f)
+
+    for name, setup in BENCHMARKS:
+        line = '%-18s %12.0f /s' % (name, results[name])
+        if name in baseline:
+            line += '  %+6.1f%%' % (100.0 * (results[name] / baseline[name] - 1))
+        print line
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'save':
+        with open(sys.argv[2], 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+    if baseline:
+        threshold = float(sys.argv[3]) if len(sys.argv) > 3 else THRESHOLD
+        slower = compare(results, baseline, threshold)
+        for name, ops, base in slower:
+            print 'SLOWER %s: %.0f/s against %.0f/s' % (name, ops, base)
+        sys.exit(1 if slower else 0)
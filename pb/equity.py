@@ -0,0 +1,221 @@
+# coding: utf-8
+"""
+equity.py
+
+Hold 'em equity calculator. Given the hole cards of any number of players and
+a (possibly empty) board, deal out the rest of the board at random many times
+and count how often each player wins or ties.
+
+The trials are split between a pool of worker processes. Every worker gets
+its own random stream seeded from the one seed passed in, so the same seed
+(and number of workers) always gives the same answer.
+
+When there are fewer possible run-outs than trials (on the flop or turn) the
+calculator enumerates every one of them instead, and the result is exact.
+Exact results are cached, so asking again about the same spot later in the
+hand (eg. announcing equity every street of an all-in) costs nothing.
+
+>>> holes = [map(poker.card_from_str, ['Ah', 'Kh']), map(poker.card_from_str, ['Qs', 'Qd'])]
+>>> for e in equity(holes, trials=100000, workers=4, seed=1): print e
+Equity(win=45.996, tie=0.404, equity=46.198, error=0.30837750774519207)
+Equity(win=53.6, tie=0.404, equity=53.80200000000001, error=0.308377507745192)
+"""
+
+import collections
+import itertools
+import math
+import multiprocessing
+import random
+import poker
+import lookup
+
+Equity = collections.namedtuple('Equity', 'win tie equity error')
+
+# exact results, keyed by (sorted hole masks, board mask, dead mask) after
+# canonicalizing suits.
+CACHE = {}
+CACHE_SIZE = 10000
+
+def score(ranks, wins, ties, shares, squares):
+    """
+    Add one board's result to the running totals.
+    """
+    best = min(ranks)
+    winners = [p for p, r in enumerate(ranks) if r == best]
+    share = 1.0 / len(winners)
+    for p in winners:
+        if share == 1.0:
+            wins[p] += 1
+        else:
+            ties[p] += 1
+        shares[p] += share
+        squares[p] += share * share
+
+def live_cards(holes, board, dead):
+    """
+    The card ints still in the deck.
+    """
+    used = board | dead
+    for h in holes:
+        used |= h
+    return [i for i in range(52) if not used & lookup.BITS[i]]
+
+def combinations_count(n, k):
+    count = 1
+    for i in range(k):
+        count = count * (n - i) // (i + 1)
+    return count
+
+def run_trials(args):
+    """
+    Worker for equity(). Deals trials boards and returns per player lists of
+    win counts, tie counts, equity sums and equity sums of squares.
+    """
+    holes, board, dead, trials, seed = args
+    rng = random.Random(seed)
+    rank_mask = lookup.rank_mask
+    bits = lookup.BITS
+    live = live_cards(holes, board, dead)
+    need = 5 - len(poker.mask_to_ints(board))
+
+    n = len(holes)
+    wins, ties, shares, squares = [0] * n, [0] * n, [0.0] * n, [0.0] * n
+    for t in xrange(trials):
+        full = board
+        for i in rng.sample(live, need):
+            full |= bits[i]
+        score([rank_mask(h | full) for h in holes], wins, ties, shares, squares)
+    return wins, ties, shares, squares
+
+def exact(holes, board=[], dead=[]):
+    """
+    Calculate equity by dealing every possible run-out of the board. Takes
+    the same arguments and returns the same thing as equity(), with an error
+    of 0. Only sensible from the flop on, preflop there are 1.7 million
+    boards.
+
+    Results are cached by the cards involved, regardless of the order they
+    are given in, and with suits relabeled canonically (see poker.canonical)
+    so every suit relabeling of a spot shares one entry.
+    """
+    perm = poker.canonical_suits([board, dead] + holes)
+    holes = [poker.mask_from_cards(poker.suits_permute(h, perm)) for h in holes]
+    board = poker.mask_from_cards(poker.suits_permute(board, perm))
+    dead = poker.mask_from_cards(poker.suits_permute(dead, perm))
+
+    order = sorted(range(len(holes)), key=lambda p: holes[p])
+    key = (tuple(holes[p] for p in order), board, dead)
+    if key not in CACHE:
+        if len(CACHE) >= CACHE_SIZE:
+            CACHE.clear()
+        CACHE[key] = enumerate_boards(list(key[0]), board, dead)
+
+    result = CACHE[key]
+    return [result[order.index(p)] for p in range(len(holes))]
+
+def enumerate_boards(holes, board, dead):
+    """
+    Score every run-out for exact(). Each player's hole cards are combined
+    with the known board once up front, so each run-out only ORs in the new
+    cards.
+    """
+    rank_mask = lookup.rank_mask
+    live = [lookup.BITS[i] for i in live_cards(holes, board, dead)]
+    need = 5 - len(poker.mask_to_ints(board))
+    partial = [h | board for h in holes]
+
+    n = len(holes)
+    wins, ties, shares, squares = [0] * n, [0] * n, [0.0] * n, [0.0] * n
+    boards = 0
+    # card bits never overlap, so a sum is the same as an OR.
+    for runout in itertools.combinations(live, need):
+        runout = sum(runout)
+        score([rank_mask(p | runout) for p in partial], wins, ties, shares, squares)
+        boards += 1
+    result = summarize([(wins, ties, shares, squares)], n, boards)
+    return [e._replace(error=0.0) for e in result]
+
+def equity(holes, board=[], trials=100000, workers=None, seed=None, dead=[]):
+    """
+    Calculate the equity of each set of hole cards against the others.
+
+    holes:   a list of 2 card lists, one for each player.
+    board:   0, 3 or 4 board cards already dealt.
+    trials:  how many random boards to deal.
+    workers: how many processes to split the trials between, defaults to the
+             number of cpus. With 1 the trials run in this process.
+    seed:    seed for the random boards. Worker n uses seed * 1000 + n.
+    dead:    any other cards known to be out of the deck (folded hands).
+
+    Returns a list of Equity tuples, one for each player. win, tie and equity
+    are percentages, and error is the half width of the 95% confidence
+    interval for equity.
+
+    If there are no more possible run-outs than trials, this hands off to
+    exact() instead.
+    """
+    masks = [poker.mask_from_cards(h) for h in holes]
+    live = live_cards(masks, poker.mask_from_cards(board), poker.mask_from_cards(dead))
+    if combinations_count(len(live), 5 - len(board)) <= trials:
+        return exact(holes, board, dead)
+
+    if seed is None:
+        seed = random.getrandbits(16)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, trials))
+
+    holes = [poker.mask_from_cards(h) for h in holes]
+    board = poker.mask_from_cards(board)
+    dead = poker.mask_from_cards(dead)
+    jobs = [(holes, board, dead, trials // workers + (w < trials % workers), seed * 1000 + w)
+            for w in range(workers)]
+
+    if workers == 1:
+        results = map(run_trials, jobs)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(run_trials, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    return summarize(results, len(holes), trials)
+
+def summarize(results, players, trials):
+    """
+    Add up worker results into a list of Equity tuples.
+    """
+    out = []
+    for p in range(players):
+        wins = sum(r[0][p] for r in results)
+        ties = sum(r[1][p] for r in results)
+        shares = sum(r[2][p] for r in results)
+        squares = sum(r[3][p] for r in results)
+        mean = shares / trials
+        variance = max(squares / trials - mean * mean, 0.0)
+        error = 1.96 * math.sqrt(variance / trials)
+        out.append(Equity(100.0 * wins / trials, 100.0 * ties / trials, 100.0 * mean, 100.0 * error))
+    return out
+
+
+if __name__ == '__main__':
+
+    """
+    Print the equity of some hands. Hole cards are pairs separated by spaces,
+    and the board (if any) comes after a |. Eg.
+
+    python equity.py AhKh QsQd | 2c7sTd
+    """
+
+    import sys
+    args = ' '.join(sys.argv[1:]).split('|')
+    split = lambda s: [poker.card_from_str(s[i:i+2]) for i in range(0, len(s), 2)]
+    holes = [split(h) for h in args[0].split()]
+    board = split(args[1].replace(' ', '')) if len(args) > 1 else []
+
+    print 'BOARD ' + poker.hand_output(board, 5)
+    for h, e in zip(holes, equity(holes, board, seed=0)):
+        print '%s  win %6.2f%%  tie %6.2f%%  equity %6.2f%% +/- %.2f' % \
+            (poker.hand_output(h), e.win, e.tie, e.equity, e.error)
@@ -1,8 +1,13 @@
 from datetime import datetime
-import time
+import collections
 import itertools
+import random
 import player
 import poker
+import history
+import outs
+import pot
+import variants
 
 class txt(object):
     """
@@ -10,17 +15,25 @@ class txt(object):
     """
     buttons = 'SB BB UG CO D'
     rule = '-----------------------------------------------------------'
-    topic = 'NLHE %d/%d | Hand %d %s | %d/%d players ("sit" to play)'
+    topic = '%s %d/%d | Hand %d %s | %d/%d players ("sit" to play)'
     dealing = 'dealing %s to %s ($%d)'
+    dealing_made = 'dealing %s to %s ($%d) -- %s'
     inhand = 'in-hand %s %s ($%d)'
+    inhand_made = 'in-hand %s %s ($%d) -- %s'
     showing ='showing %s "%s" for %s'
     draw = '%s %s -- POT $%d'
     winner = 'WINNER %s %s ($%d)'
+    main_pot = 'MAIN POT $%d'
+    side_pot = 'SIDE POT %d $%d'
     next = 'NEXT HAND starts in %d seconds.'
     action_a = 'POT $%d. Action on %s ($%d).'
     action_b = 'POT $%d. Action on %s ($%d) +%d to call.'
+    action_draw = 'Draw on %s, up to %d cards. ("draw" and the cards to swap, or "pat")'
+    draws = '%s draws %d.'
+    pat = '%s stands pat.'
     at_risk = '-- %s at-risk.'
     sits = '%s sits at the table.'
+    sits_elsewhere = '%s is already playing at another table.'
     stands = '%s leaves the table.'
     posts_small = '%s posts small blind (%d).'
     posts_big = '%s posts big blind (%d).'
@@ -32,6 +45,9 @@ class txt(object):
     folds = '%s folds.'
     busted = '%s has busted.'
     rebuys = '%s rebuys for %d.'
+    outs = '%s has %d outs (%s) -- %.0f%% next card, %.0f%% by the river.'
+    equity = '%s %.0f%% -- %s %.0f%%'
+    no_outs = '%s has no outs.'
 
 POSITIONS = {
     -1: 'CO', # cut-off
@@ -51,26 +67,54 @@ NAMES = [
 
 class Game(object):
 
-    def __init__(self, players=5):
+    def __init__(self, players=5, store=None, variant=None):
 
-        self.deck = None
+        # one deck for the table, reset every hand, dealing from the table's
+        # own random stream.
+        self.rng = random.Random(random.getrandbits(32))
+        self.deck = poker.Deck()
         self.board = None
         self.pot = 0
         self.current_bet = 0
         self.action = 0
 
         self.hand_num = 0
+        # seconds between hands
+        self.delay = 8
+        # the deck seed for this hand, and what happened in it, for the hand
+        # history. (see history.py)
+        self.seed = None
+        self.actions = []
+        self.results = []
+        self.history = None
+        # the table's id (eg. its channel), so hands in a shared history can
+        # be told apart.
+        self.table = ''
         self.sb = 15
         self.bb = 30
         self.ante = 0
         self.max_players = 9
+        # where output goes, a function taking each line and whether it is
+        # urgent (someone is waiting on it). None prints to the console.
+        self.output = None
+        # where players' bankrolls are kept between games (see store.py).
+        # None gives everyone a fresh stack.
+        self.store = store
+        # the preflop equity table (see preflop.py), to call the odds when two
+        # players are all-in before the flop. None for no odds.
+        self.preflop = None
+        # the house players aren't kept in the store, they'd be the same
+        # players at every table.
         self.players = [player.Player(NAMES[p]) for p in range(players)]
-        self.rounds = [
-            ('PREFLOP', 0),
-            ('FLOP', 3),
-            ('TURN', 1),
-            ('RIVER', 1),
-        ]
+        # the game being played (see variants.py), and its rounds.
+        self.variant = variant or variants.HOLDEM
+        self.rounds = self.variant.rounds
+        # True while players are drawing, rather than betting.
+        self.drawing = False
+        # players who sat down or stood up during a hand, seated or let go
+        # when the next one starts.
+        self.joining = []
+        self.leaving = set()
 
     def parse(self, cmd):
         """
@@ -78,90 +122,271 @@ class Game(object):
         """
         pass
 
-    def out(self, msg):
+    def new_player(self, name):
+        if self.store:
+            return self.store.load(name)
+        return player.Player(name)
+
+    def sit(self, name):
+        """
+        take a seat, from the next hand on.
+        """
+        names = [p.name for p in self.players + self.joining]
+        if name in names or len(names) >= self.max_players:
+            return
+        # their seat is kept in their Player, which can only be in one place.
+        if self.store and self.store.held(name):
+            self.out(txt.sits_elsewhere % name)
+            return
+        self.joining.append(self.new_player(name))
+        self.out(txt.sits % name)
+
+    def stand(self, name):
+        """
+        leave the table. a player in a hand stays until it's over.
+        """
+        if name in [p.name for p in self.players + self.joining]:
+            self.leaving.add(name)
+            self.out(txt.stands % name)
+
+    def seat_players(self):
+        """
+        seat everyone who sat down and let go everyone who stood up since
+        the last hand.
+        """
+        players = []
+        for p in self.players + self.joining:
+            if p.name not in self.leaving:
+                players.append(p)
+            elif self.store:
+                self.store.release(p)
+        self.players = players
+        self.joining = []
+        self.leaving = set()
+
+    def out(self, msg, urgent=False):
         """
         output a game action
         """
-        print '[%02d:%02d] * pbt >> ' % (datetime.now().hour, datetime.now().minute) + msg
+        if self.output:
+            self.output(msg, urgent)
+            return
+        now = datetime.now()
+        print '[%02d:%02d] * pbt >> ' % (now.hour, now.minute) + msg
 
     def draw(self, round):
         """
-        draw n cards and add them to the board.
+        draw n cards and add them to the board. each player's hand is kept as
+        a card mask, so only the new cards need adding to find the made hand.
         """
-        self.board += [self.deck.next() for i in range(round[1])]
+        cards = self.deck.deal(round.board)
+        self.board += cards
+        added = poker.mask_from_cards(cards)
         for p in self.players:
-            self.out(txt.inhand % (poker.hand_output(p.cards), p.name, p.stack))
+            p.mask |= added
+            if p.folded:
+                continue
+            if len(p.cards) + len(self.board) >= 5:
+                p.rank = self.variant.rank(p.mask)
+                self.out(txt.inhand_made % (poker.hand_output(p.cards), p.name, p.stack,
+                    self.variant.describe(p.rank, p.mask)))
+            else:
+                self.out(txt.inhand % (poker.hand_output(p.cards), p.name, p.stack))
         self.out('')
-        self.out(txt.draw % (round[0], poker.hand_output(self.board, 5), self.pot))
+        self.out(txt.draw % (round.name, poker.hand_output(self.board, self.variant.board_size), self.pot))
         self.out('')
 
     def bet(self, player, amt):
         """
-        bet some monies
+        bet some monies. nobody can bet more than they have, betting the
+        whole stack puts the player all-in.
         """
+        amt = min(amt, player.stack)
         player.stack -= amt
         player.current_bet += amt
+        player.total_bet += amt
+        if not player.stack:
+            player.allin = True
         self.current_bet = max(self.current_bet, amt)
         self.pot += amt
+        return amt
+
+    def act(self, player, action, amt=0):
+        """
+        note a player's action for the hand history.
+        """
+        self.actions.append(history.Action(self.players.index(player), action, amt))
 
     def deal(self):
         """
         deal the hand.
         """
         for p in self.players:
-            p.cards = [self.deck.next(), self.deck.next()]
+            p.cards = self.deck.deal(self.variant.hole)
             p.cards.sort(key=lambda c: c.value, reverse=True)
-            self.out(txt.dealing % (poker.hand_output(p.cards), p.name, p.stack))
+            p.mask = poker.mask_from_cards(p.cards)
+            if len(p.cards) >= 5:
+                # draw games, the hand is made already.
+                p.rank = self.variant.rank(p.mask)
+                self.out(txt.dealing_made % (poker.hand_output(p.cards), p.name, p.stack,
+                    self.variant.describe(p.rank, p.mask)))
+            else:
+                self.out(txt.dealing % (poker.hand_output(p.cards), p.name, p.stack))
+
+    def discard(self, p, cmd, most):
+        """
+        swap the cards named in a draw command (eg. "draw 7c Kd") for new
+        ones, up to most of them. anything else stands pat.
+        """
+        words = (cmd or '').split()
+        cards = []
+        if words and words[0] == 'draw':
+            for w in words[1:]:
+                c = poker.card_from_str(w) if len(w) == 2 else None
+                if c in p.cards and c not in cards:
+                    cards.append(c)
+        cards = cards[:min(most, self.deck.remaining())]
+        if not cards:
+            self.out(txt.pat % p.name)
+            return
+        p.cards = [c for c in p.cards if c not in cards] + self.deck.deal(len(cards))
+        p.cards.sort(key=lambda c: c.value, reverse=True)
+        p.mask = poker.mask_from_cards(p.cards + self.board)
+        p.rank = self.variant.rank(p.mask)
+        self.out(txt.draws % (p.name, len(cards)))
+        self.out(txt.inhand_made % (poker.hand_output(p.cards), p.name, p.stack,
+            self.variant.describe(p.rank, p.mask)))
+
+    def show_equity(self):
+        """
+        two players all-in before the flop, nothing left to bet: say what
+        each one's chances are, from the preflop table.
+        """
+        live = [p for p in self.players if not p.folded]
+        if not self.preflop or self.variant is not variants.HOLDEM or self.board or len(live) != 2:
+            return
+        if sum(not p.allin for p in live) > 1:
+            return
+        a, b = live
+        e = self.preflop.equity(a.cards, b.cards)
+        self.out(txt.equity % (a.name, e, b.name, 100.0 - e))
 
     def showdown(self):
         """
-        showdown
-        TODO: side pots for allin players
+        showdown. ranks were kept up to date street by street in draw, so
+        the main and side pots are awarded straight from those, and only the
+        winning hands need building in full.
         """
-        #
-        # build hands
-        for p in self.players:
-            p.hand = poker.hand_build(p.cards + self.board)
-
-        ranked = sorted(self.players, key=lambda p: p.hand.rank)
-        winners = [p for p in ranked if p.hand.rank == ranked[0].hand.rank]
-        split = self.pot / len(winners)
+        live = [p for p in self.players if not p.folded]
+        seats = dict((id(p), i) for i, p in enumerate(self.players))
+        awards = pot.award(self.players, lambda p: seats[id(p)])
 
-        self.out(txt.draw % ('SHOWDOWN', poker.hand_output(self.board, 5), self.pot))
+        self.out(txt.draw % ('SHOWDOWN', poker.hand_output(self.board, self.variant.board_size), self.pot))
         self.out('')
-        for p in self.players:
-            self.out(txt.showing % (poker.hand_output(p.cards), p.hand.desc, p.name))
+        for p in live:
+            self.out(txt.showing % (poker.hand_output(p.cards), self.variant.describe(p.rank, p.mask), p.name))
 
         self.out('')
 
-        for p in winners:
-            p.stack += split
-            self.out(txt.winner % (poker.hand_output(p.hand.cards), p.name, p.stack))
+        for n, award in enumerate(awards):
+            if len(awards) > 1:
+                self.out(txt.side_pot % (n, award.amount) if n else txt.main_pot % award.amount)
+            for p, chips in award.winners:
+                p.stack += chips
+                self.results.append((self.players.index(p), chips))
+                if p.hand is None:
+                    p.hand = self.variant.hand(p.rank, p.cards + self.board)
+                self.out(txt.winner % (poker.hand_output(p.hand.cards), p.name, p.stack))
 
         self.out('')
 
 
-    def allin(self):
-        pass
+    def allin(self, player):
+        """
+        push a player's whole stack in.
+        """
+        amt = self.bet(player, player.stack)
+        self.act(player, 'allin', amt)
+        self.out(txt.raises_all % (player.name, player.current_bet))
+
+    def show_outs(self, name):
+        """
+        tell a player in the hand their outs, on the flop or turn.
+        """
+        live = [p for p in self.players if p.name == name and p.cards and not p.folded]
+        if not live or self.variant is not variants.HOLDEM or len(self.board) not in (3, 4):
+            return
+        o = outs.find(live[0].cards, self.board)
+        if not o.cards:
+            self.out(txt.no_outs % name)
+            return
+        # keep it short, "two pair - kings and nines" is just two pair here.
+        kinds = collections.Counter()
+        for desc, n in o.groups.items():
+            kinds[desc.split(' - ')[0]] += n
+        groups = ', '.join('%d %s' % (n, kind) for kind, n in kinds.most_common())
+        self.out(txt.outs % (name, len(o.cards), groups, o.next_card, o.by_river))
 
     def valid(self, p, cmd):
-        return True
+        """
+        whether cmd is something the player in action can do right now.
+        """
+        words = (cmd or '').split()
+        if not words:
+            return False
+        if self.drawing:
+            return cmd in ('pat', 'fold') or words[0] == 'draw'
+        return cmd in ('check', 'call', 'fold')
+
+    def in_action(self, name):
+        """
+        whether name is the player the game is waiting on.
+        """
+        return 0 <= self.action < len(self.players) and self.players[self.action].name == name
+
+    def timeout_command(self):
+        """
+        what to do for the player in action when they take too long: check
+        if they can, otherwise fold. stand pat if drawing.
+        """
+        if self.drawing:
+            return 'pat'
+        p = self.players[self.action]
+        if p.current_bet >= self.current_bet:
+            return 'check'
+        return 'fold'
 
     def play(self):
         """
         This coroutine represents a synchronous loop of game logic.
         The bot may need to perform other tasks while this is executing, so it
         will yield control whenever it is waiting for user action.
+
+        Between hands it yields a number of seconds to wait instead. Whatever
+        drives the coroutine should wait that long (without blocking anything
+        else) and then send None to start the next hand.
         """
         while True:
 
             self.hand_num += 1
+            self.seat_players()
 
-            self.deck = poker.deck()
+            # each hand gets its own deck seed, so it can be dealt again
+            # exactly from the hand history.
+            self.seed = self.rng.getrandbits(32)
+            self.deck.reset(self.seed)
             self.board = []
+            self.actions = []
+            self.results = []
+            stacks = [p.stack for p in self.players]
             for p in self.players:
                 p.hand = None
                 p.cards = []
+                p.mask = 0
+                p.rank = None
+                p.total_bet = 0
+                p.folded = False
+                p.allin = False
                 p.current_bet = 0
 
             self.pot = 0
@@ -172,14 +397,15 @@ class Game(object):
             # assign action order
 
             # pre-deal
-            self.out(txt.topic % (self.sb, self.bb, self.hand_num, poker.hand_output(self.board, 5), len(self.players), self.max_players))
+            self.out(txt.topic % (self.variant.title, self.sb, self.bb, self.hand_num,
+                poker.hand_output(self.board, self.variant.board_size), len(self.players), self.max_players))
             self.out(txt.rule)
             self.out(txt.posts_small % (self.players[0].name, self.sb))
             self.out(txt.posts_big % (self.players[1].name, self.bb))
 
             # post blinds
-            self.bet(self.players[0], self.sb)
-            self.bet(self.players[1], self.bb)
+            self.act(self.players[0], 'small', self.bet(self.players[0], self.sb))
+            self.act(self.players[1], 'big', self.bet(self.players[1], self.bb))
 
             # deal
             self.deal()
@@ -187,26 +413,58 @@ class Game(object):
             # loop
             for r in self.rounds:
                 # betting cycle
-                if r[0] != 'PREFLOP':
+                if r.board:
 
                     # perform the draw
                     self.draw(r)
+                    self.actions.append(history.Action(history.NO_SEAT, 'deal', len(self.board)))
 
                     # change topic every round
                     self.out(txt.topic % (
+                        self.variant.title,
                         self.sb,
                         self.bb,
                         self.hand_num,
-                        poker.hand_output(self.board, 5),
+                        poker.hand_output(self.board, self.variant.board_size),
                         len(self.players),
                         self.max_players)
                     )
 
                 self.out(txt.rule)
 
+                # players swap cards, in turn.
+                if r.draw:
+                    self.drawing = True
+                    for i, p in enumerate(self.players):
+                        if p.folded:
+                            continue
+                        if sum(not q.folded for q in self.players) == 1:
+                            break
+                        self.action = i
+                        self.out(txt.action_draw % (p.name, r.draw), True)
+
+                        while True:
+                            cmd = yield
+                            if self.valid(p, cmd): break
+
+                        if cmd == 'fold':
+                            p.folded = True
+                            self.act(p, 'fold')
+                            self.out(txt.folds % p.name)
+                            continue
+                        self.discard(p, cmd, r.draw)
+                    self.drawing = False
+                    self.out(txt.rule)
+
                 # loop through players
-                for p in self.players:
-                    self.out(txt.action_b % (self.pot, p.name, p.stack, self.current_bet - p.current_bet))
+                for i, p in enumerate(self.players):
+                    if p.folded or p.allin:
+                        continue
+                    # everyone else folded, nobody left to bet against.
+                    if sum(not q.folded for q in self.players) == 1:
+                        break
+                    self.action = i
+                    self.out(txt.action_b % (self.pot, p.name, p.stack, self.current_bet - p.current_bet), True)
 
                     # yield here
                     # resume when we have valid hand input to act upon.
@@ -214,17 +472,36 @@ class Game(object):
                         cmd = yield
                         if self.valid(p, cmd): break
 
+                    if cmd == 'fold':
+                        p.folded = True
+                        self.act(p, 'fold')
+                        self.out(txt.folds % p.name)
+                        continue
+
                     # todo replace this with logic for different commands
-                    bet = self.current_bet - p.current_bet
-                    self.bet(p, bet)
+                    bet = self.bet(p, self.current_bet - p.current_bet)
+                    self.act(p, 'call' if bet else 'check', bet)
                     self.out(txt.calls % (p.name, bet))
 
                 self.out(txt.rule)
+                self.show_equity()
 
             self.showdown()
-            self.out(txt.next % 30)
+            # the history only has room for hold 'em hands.
+            if self.history and self.variant is variants.HOLDEM:
+                self.history.write(history.HandRecord(
+                    self.table,
+                    self.hand_num,
+                    self.seed,
+                    [history.Seat(p.name, s, map(poker.card_to_int, p.cards)) for p, s in zip(self.players, stacks)],
+                    map(poker.card_to_int, self.board),
+                    self.actions,
+                    self.results))
+            if self.store:
+                self.store.hand_done(self.players)
+            self.out(txt.next % self.delay)
             self.out(txt.rule)
-            time.sleep(8)
+            yield self.delay
 
     # for p in self.players:
     # cards = poker.hand_output(p.cards)
@@ -0,0 +1,199 @@
+"""
+history.py
+
+Append-only hand history log. Every hand played is written as one compact
+binary record, so disputes can be settled and hands analyzed later without
+parsing the game's text output.
+
+FILE FORMAT
+
+The file is a plain sequence of records, each a 4 byte little endian length
+followed by that many bytes of record. A record that was only partly written
+(the bot died mid-write) is ignored by the reader, and cut off by the writer
+before it appends anything. Inside a record:
+
+    header      version (B), hand number (I), deck seed (I), seats (B),
+                board cards (B), actions (H), results (B)
+    table       id length (B), id (utf-8), eg. the channel. hand numbers
+                are only unique within a table. (not in version 1)
+    each seat   name length (B), name (utf-8), stack before the hand (i),
+                2 hole cards (B each, 255 if none)
+    board       one byte per card
+    each action seat (B), action (B, see ACTIONS), amount (i). a 'deal'
+                action marks the start of a new street, with no seat
+                (NO_SEAT) and the board size after the deal as amount.
+    each result seat (B), chips won (i)
+
+Cards are stored as card ints (see poker.card_to_int).
+"""
+
+import collections
+import mmap
+import os
+import struct
+import time
+import irc
+
+VERSION = 2
+ACTIONS = ['small', 'big', 'ante', 'check', 'call', 'raise', 'allin', 'fold', 'deal']
+
+HandRecord = collections.namedtuple('HandRecord', 'table hand seed seats board actions results')
+Seat = collections.namedtuple('Seat', 'name stack cards')
+Action = collections.namedtuple('Action', 'seat action amount')
+
+LENGTH = struct.Struct('<I')
+HEADER = struct.Struct('<BIIBBHB')
+STACK = struct.Struct('<iBB')
+ACTION = struct.Struct('<BBi')
+RESULT = struct.Struct('<Bi')
+NO_CARD = 255
+NO_SEAT = 255
+
+def encode(record):
+    """
+    Pack a HandRecord into bytes, without the length prefix.
+    """
+    parts = [HEADER.pack(VERSION, record.hand, record.seed, len(record.seats),
+        len(record.board), len(record.actions), len(record.results))]
+    table = record.table.encode('utf-8')
+    parts.append(chr(len(table)) + table)
+    for seat in record.seats:
+        name = seat.name.encode('utf-8')
+        cards = (list(seat.cards) + [NO_CARD, NO_CARD])[:2]
+        parts.append(chr(len(name)) + name + STACK.pack(seat.stack, *cards))
+    parts.append(''.join(chr(c) for c in record.board))
+    for a in record.actions:
+        parts.append(ACTION.pack(a.seat, ACTIONS.index(a.action), a.amount))
+    for seat, won in record.results:
+        parts.append(RESULT.pack(seat, won))
+    return ''.join(parts)
+
+def decode(data, offset=0):
+    """
+    Unpack a HandRecord from bytes (or an mmap) starting at offset.
+    """
+    version, hand, seed, seats, board, actions, results = HEADER.unpack_from(data, offset)
+    if version not in (1, VERSION):
+        raise ValueError('unknown hand history version %d' % version)
+    offset += HEADER.size
+
+    table = u''
+    if version > 1:
+        length = ord(data[offset])
+        table = data[offset+1:offset+1+length].decode('utf-8')
+        offset += 1 + length
+
+    seat_list = []
+    for i in range(seats):
+        length = ord(data[offset])
+        name = data[offset+1:offset+1+length].decode('utf-8')
+        offset += 1 + length
+        stack, a, b = STACK.unpack_from(data, offset)
+        offset += STACK.size
+        seat_list.append(Seat(name, stack, [c for c in (a, b) if c != NO_CARD]))
+
+    board_list = [ord(c) for c in data[offset:offset+board]]
+    offset += board
+
+    action_list = []
+    for i in range(actions):
+        seat, action, amount = ACTION.unpack_from(data, offset)
+        action_list.append(Action(seat, ACTIONS[action], amount))
+        offset += ACTION.size
+
+    result_list = []
+    for i in range(results):
+        result_list.append(RESULT.unpack_from(data, offset))
+        offset += RESULT.size
+
+    return HandRecord(table, hand, seed, seat_list, board_list, action_list, result_list)
+
+def complete_size(path):
+    """
+    How many bytes at the start of a log are whole records. Anything after
+    that is a record the bot died writing.
+    """
+    if not os.path.exists(path):
+        return 0
+    end = 0
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        while end + LENGTH.size <= size:
+            f.seek(end)
+            length, = LENGTH.unpack(f.read(LENGTH.size))
+            if end + LENGTH.size + length > size:
+                break
+            end += LENGTH.size + length
+    return end
+
+
+class HistoryWriter(object):
+    """
+    Appends records to a log file. Writes are buffered, and the file is
+    flushed and fsynced to disk every sync_every records or sync_seconds,
+    whichever comes first, so a crash loses at most that much history. The
+    time is only checked when a record is written, so keep_synced() runs the
+    same check from the event loop, or a quiet bot's last hands would sit in
+    the buffer. close() it on the way out.
+
+    A record left half written by a crash is cut off when the log is opened,
+    otherwise everything appended after it would be read through its length.
+    """
+
+    def __init__(self, path, sync_every=100, sync_seconds=5.0):
+        end = complete_size(path)
+        self.file = open(path, 'ab', 64 * 1024)
+        self.file.truncate(end)
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        self.pending = 0
+        self.synced = time.time()
+
+    def write(self, record):
+        data = encode(record)
+        self.file.write(LENGTH.pack(len(data)) + data)
+        self.pending += 1
+        if self.pending >= self.sync_every or time.time() - self.synced >= self.sync_seconds:
+            self.sync()
+
+    def keep_synced(self):
+        """
+        Sync whatever is buffered now and every sync_seconds after, from the
+        event loop.
+        """
+        if self.pending:
+            self.sync()
+        return irc.call_later(self.sync_seconds, self.keep_synced)
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.synced = time.time()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def read(path):
+    """
+    Iterate over every HandRecord in a log. The file is memory mapped, so
+    only the pages being read are ever loaded, however big the log is.
+    """
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        offset, size = 0, len(data)
+        while offset + LENGTH.size <= size:
+            length, = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            if offset + length > size:
+                # a partly written record at the end, from a crash.
+                break
+            yield decode(data, offset)
+            offset += length
+    finally:
+        data.close()
@@ -1,59 +1,201 @@
-import sys
+"""
+irc.py
+
+A non-blocking IRC connection built on asyncore/asynchat, so the bot can sit
+in an event loop serving the game and the network at the same time.
+
+Incoming data is buffered and split into whole lines (a line split across two
+reads is put back together), PINGs are answered automatically, and when the
+connection drops it reconnects with an exponential backoff. Every PRIVMSG is
+handed to on_message(nick, target, text), and on_ready() is called every time
+the connection is registered and has joined its channels.
+
+The event loop also runs timers (call_later), for anything that needs to
+happen later without blocking the loop.
+"""
+
+import asynchat
+import asyncore
+import heapq
+import itertools
 import socket
-import string
+import sys
+import time
+import traceback
 
 HOST = 'irc.freenode.net'
 PORT = 6667
 NICK = 'pokerbot'
-IDENT = ''
+IDENT = 'pokerbot'
 MODE = 0
 REALNAME = 'pokerbot'
 
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
-s.setblocking(0)
+# longest wait between reconnect attempts, in seconds.
+MAX_BACKOFF = 300
+
+# pending timers as (when, sequence, function, args)
+TIMERS = []
+sequence = itertools.count()
 
-def connect(address, port):
+def call_later(delay, fn, *args):
     """
+    Run fn(*args) from the event loop after delay seconds. Returns the timer,
+    which can be passed to cancel.
     """
-    s.connect((address, port))
+    timer = [time.time() + delay, next(sequence), fn, args]
+    heapq.heappush(TIMERS, timer)
+    return timer
 
-def select():
+def cancel(timer):
     """
+    Stop a timer from firing. It stays in the heap until it comes due.
     """
-    # non-blocking select
-    in_set, _, _ = select.select([s], [s], [], 0)
+    timer[2] = None
 
-    if in_set:
-        recv_buffer = ''
-        recv_buffer = s.recv(1024)
+def run_timers():
+    now = time.time()
+    while TIMERS and TIMERS[0][0] <= now:
+        when, seq, fn, args = heapq.heappop(TIMERS)
+        if fn:
+            fn(*args)
 
-        if len(recv_buffer) > 0:
-            read(recv_buffer)
+def loop(forever=True):
+    """
+    Run the event loop: socket io and timers. Without forever, returns once
+    there are no sockets left and no timers pending.
+    """
+    while forever or asyncore.socket_map or TIMERS:
+        timeout = 1.0
+        if TIMERS:
+            timeout = max(0.0, min(timeout, TIMERS[0][0] - time.time()))
+        if asyncore.socket_map:
+            asyncore.loop(timeout, count=1)
         else:
-            # closed connection
-            s.close()
-            continue
+            time.sleep(timeout)
+        run_timers()
+
+def parse(line):
+    """
+    Split a raw IRC line into (prefix, command, params). The trailing param
+    (after " :") is kept whole.
+
+    >>> parse(':synx!~s@host PRIVMSG ##poker :call')
+    ('synx!~s@host', 'PRIVMSG', ['##poker', 'call'])
+    """
+    prefix = ''
+    if line.startswith(':'):
+        prefix, line = line[1:].split(' ', 1)
+    if ' :' in line:
+        line, trailing = line.split(' :', 1)
+        params = line.split() + [trailing]
+    else:
+        params = line.split()
+    return prefix, params[0].upper(), params[1:]
 
 
-def write(data):
+class Connection(asynchat.async_chat):
     """
-    send a raw command to irc server.
+    A single connection to an IRC server, joining channels once registered.
     """
-    s.send(data + '\r\n')
 
-def read(data):
+    def __init__(self, host=HOST, port=PORT, nick=NICK, channels=[], on_message=None, on_ready=None):
+        asynchat.async_chat.__init__(self)
+        self.host = host
+        self.port = port
+        self.nick = nick
+        self.channels = channels
+        self.on_message = on_message
+        self.on_ready = on_ready
+        self.registered = False
+        self.failures = 0
+        self.buffer = []
+        self.set_terminator('\n')
 
-    for line in data.split('\n'):
-        line = line.rstrip()
-        tokens = line.split()
+    def connect_server(self):
+        """
+        Start connecting. Registration happens once the socket is connected.
+        """
+        self.buffer = []
+        self.registered = False
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            self.connect((self.host, self.port))
+        except socket.error:
+            # eg. the name doesn't resolve while the network is down.
+            traceback.print_exc()
+            self.reconnect()
+
+    def reconnect(self):
+        """
+        Drop the connection and try again later, waiting twice as long after
+        each failure in a row.
+        """
+        self.close()
+        asynchat.async_chat.__init__(self)
+        self.set_terminator('\n')
+        delay = min(2 ** self.failures, MAX_BACKOFF)
+        self.failures += 1
+        call_later(delay, self.connect_server)
+
+    def write(self, data):
+        """
+        send a raw command to irc server.
+        """
+        self.push(data + '\r\n')
+
+    def privmsg(self, target, text):
+        self.write('PRIVMSG %s :%s' % (target, text))
+
+    def identify(self):
+        self.write('NICK %s' % self.nick)
+        self.write('USER %s %d * :%s' % (IDENT, MODE, REALNAME))
+
+    def handle_connect(self):
+        self.identify()
+
+    def handle_close(self):
+        self.reconnect()
+
+    def handle_error(self):
+        """
+        asyncore sends every exception here, from the socket and from
+        on_message alike. only socket errors mean the connection is gone, so
+        only those reconnect. anything else is a bug: it's logged, and the
+        connection is kept.
+        """
+        traceback.print_exc()
+        if isinstance(sys.exc_info()[1], socket.error):
+            self.reconnect()
+
+    def collect_incoming_data(self, data):
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        line = ''.join(self.buffer).rstrip('\r')
+        self.buffer = []
+        if line:
+            self.handle_line(line)
+
+    def handle_line(self, line):
+        prefix, command, params = parse(line)
 
         # automatically reply to PING
-        if(tokens[0] == 'PING'):
-            write('PONG %s' % tokens[1])
-        else:
-            yield line
+        if command == 'PING':
+            self.write('PONG :%s' % (params[0] if params else ''))
+
+        # welcome, we're registered.
+        elif command == '001':
+            self.registered = True
+            self.failures = 0
+            for channel in self.channels:
+                self.write('JOIN %s' % channel)
+            if self.on_ready:
+                self.on_ready()
 
-def identify():
-    write('NICK %s' % NICK)
-    write('USER %s %d * :%s' % (IDENT, MODE, REALNAME))
+        # nick taken, try another.
+        elif command == '433':
+            self.nick += '_'
+            self.write('NICK %s' % self.nick)
 
+        elif command == 'PRIVMSG' and len(params) == 2 and self.on_message:
+            self.on_message(prefix.split('!')[0], params[0], params[1])
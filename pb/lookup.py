@@ -0,0 +1,241 @@
+# coding: utf-8
+"""
+lookup.py
+
+A table driven hand ranker. hand_build does a lot of work per hand (sorting,
+grouping, straight checks and formatting a description) which is fine for a
+single showdown, but way too slow when ranking thousands of hands. This module
+precomputes the rank of every possible hand shape once, so ranking a hand is
+only a couple of table lookups.
+
+The ranks returned are exactly the ones hand_build would return, since the
+tables are generated by running hand_build over every shape.
+
+TABLES
+
+Poker hands only really come in two shapes:
+
+1.  flushes. If 5 or more cards share a suit, nothing the other cards in a 7
+    card hand can do will beat it (quads and boats need too many suits), so
+    the rank only depends on which values are in the flush suit. We index
+    these with a 13-bit mask of the values in that suit. (FLUSHES)
+
+2.  everything else. Without a flush, suits don't matter at all and the rank
+    depends only on how many cards of each value are in the hand. We pack
+    those counts into an int using 3 bits per value (VALUE_KEYS), which can
+    simply be added together card by card. (RANKS)
+"""
+
+import itertools
+import poker
+
+# bit for each card value in a suit mask, value 1 (duece) is bit 0.
+VALUE_BITS = [0] + [1 << (v - 1) for v in range(1, 14)]
+# additive key for each card value, 3 bits each so it can count up to 4.
+VALUE_KEYS = [0] + [1 << (3 * (v - 1)) for v in range(1, 14)]
+
+FLUSHES = {}
+RANKS = {}
+
+# the value key for every 13-bit suit mask, ie. the sum of VALUE_KEYS for
+# each value in the mask.
+SPREAD = [0] * 0x2000
+for mask in range(1, 0x2000):
+    low = mask & -mask
+    SPREAD[mask] = SPREAD[mask ^ low] + VALUE_KEYS[low.bit_length()]
+# mask bit for each card int.
+BITS = [1 << i for i in range(52)]
+
+def build_tables():
+    """
+    Fill FLUSHES and RANKS by running hand_build over every 5, 6 and 7 card
+    hand shape. Takes a second or two, and happens once when this module is
+    imported.
+    """
+    values = range(1, 14)
+    for n in (5, 6, 7):
+
+        # flushes, all cards in the same suit.
+        for combo in itertools.combinations(values, n):
+            mask = sum(VALUE_BITS[v] for v in combo)
+            FLUSHES[mask] = poker.hand_build([poker.Card(v, 0) for v in combo]).rank
+
+        # everything else. deal suits round robin so there can never be more
+        # than 2 cards of a suit, and each value never repeats a suit.
+        for combo in itertools.combinations_with_replacement(values, n):
+            if max(combo.count(v) for v in set(combo)) > 4:
+                continue
+            key = sum(VALUE_KEYS[v] for v in combo)
+            cards = [poker.Card(v, i % 4) for i, v in enumerate(combo)]
+            RANKS[key] = poker.hand_build(cards).rank
+
+def rank(cards):
+    """
+    Rank a list of 5 to 7 cards. Returns the same integer hand_build would
+    give as Hand.rank, lower is better.
+    """
+    key = 0
+    suits = [0, 0, 0, 0]
+    for c in cards:
+        key += VALUE_KEYS[c.value]
+        suits[c.suit] |= VALUE_BITS[c.value]
+    for mask in suits:
+        if mask in FLUSHES:
+            return FLUSHES[mask]
+    return RANKS[key]
+
+def rank_mask(mask):
+    """
+    Rank a hand stored as a card mask (see poker.mask_from_cards). No per
+    card work at all, each suit is looked up whole.
+    """
+    s0 = mask & 0x1FFF
+    s1 = (mask >> 13) & 0x1FFF
+    s2 = (mask >> 26) & 0x1FFF
+    s3 = mask >> 39
+    for s in (s0, s1, s2, s3):
+        if s in FLUSHES:
+            return FLUSHES[s]
+    return RANKS[SPREAD[s0] + SPREAD[s1] + SPREAD[s2] + SPREAD[s3]]
+
+def rank_ints(ints):
+    """
+    Rank a list of 5 to 7 card ints (see poker.card_to_int).
+    """
+    mask = 0
+    for i in ints:
+        mask |= BITS[i]
+    return rank_mask(mask)
+
+"""
+OMAHA
+
+An omaha hand is the best of 60 five card hands: 6 pairs of hole cards times
+10 triples of board cards. The board triples are the same for every player,
+so they are worked out once per board with omaha_board and shared by the
+whole table. Each part is kept as (value key, suit, suit mask), where suit is
+only set when all the cards share one (mixed hole pairs get -1 and mixed
+board triples -2) so a combination is a flush exactly when both parts have
+the same suit. Then every one of the 60 hands is a
+single table lookup.
+"""
+
+def omaha_part(cards, mixed):
+    key = sum(VALUE_KEYS[c.value] for c in cards)
+    suits = set(c.suit for c in cards)
+    if len(suits) == 1:
+        return key, cards[0].suit, sum(VALUE_BITS[c.value] for c in cards)
+    return key, mixed, 0
+
+def omaha_board(board):
+    """
+    Precompute the 10 board triples for rank_omaha.
+    """
+    assert len(board) == 5
+    return [omaha_part(t, -2) for t in itertools.combinations(board, 3)]
+
+def rank_omaha(hole, board):
+    """
+    Rank a 4 card omaha hand against a board, which is either 5 cards or the
+    result of omaha_board. Returns the same rank as hand_build_omaha.
+    """
+    assert len(hole) == 4
+    if len(board) == 5:
+        board = omaha_board(board)
+    best = 0xFFFFFF
+    for pkey, psuit, pmask in [omaha_part(p, -1) for p in itertools.combinations(hole, 2)]:
+        for bkey, bsuit, bmask in board:
+            if psuit == bsuit:
+                r = FLUSHES[pmask | bmask]
+            else:
+                r = RANKS[pkey + bkey]
+            if r < best:
+                best = r
+    return best
+
+def hand_build_omaha(hole, board):
+    """
+    The same as poker.hand_build_omaha, but only the winning combination is
+    run through hand_build.
+    """
+    board_triples = list(itertools.combinations(board, 3))
+    best, best_rank = None, 0xFFFFFF
+    for pair in itertools.combinations(hole, 2):
+        for triple in board_triples:
+            r = rank(pair + triple)
+            if r < best_rank:
+                best, best_rank = pair + triple, r
+    return poker.hand_build(list(best))
+
+def bench_omaha(hands=200, players=9, seed=0):
+    """
+    Time omaha showdowns for a full table, comparing poker.hand_build_omaha
+    on the reference engine (hand_build) with rank_omaha. Returns (reference
+    seconds, fast seconds).
+    """
+    import random
+    import time
+    rng = random.Random(seed)
+    deals = []
+    for i in range(hands):
+        cards = rng.sample(poker.CARDS, 4 * players + 5)
+        deals.append(([cards[4*p:4*p+4] for p in range(players)], cards[-5:]))
+
+    start = time.time()
+    slow = [[poker.hand_build_omaha(h, board, 'reference').rank for h in holes] for holes, board in deals]
+    mid = time.time()
+    fast = []
+    for holes, board in deals:
+        triples = omaha_board(board)
+        fast.append([rank_omaha(h, triples) for h in holes])
+    end = time.time()
+
+    assert slow == fast
+    return mid - start, end - mid
+
+def crosscheck(samples=1000000, seed=0):
+    """
+    Make sure the table engine and hand_build agree. Checks every possible 5
+    card hand, then a random sample of 7 card hands. Returns the list of
+    disagreeing hands, which should be empty.
+
+    This is slow (a couple of minutes), since it runs the reference ranker
+    on every hand.
+    """
+    import random
+    rng = random.Random(seed)
+    cards = [poker.Card(i, j) for j in range(4) for i in range(1, 14)]
+    bad = []
+    for hand in itertools.combinations(cards, 5):
+        if rank(hand) != poker.hand_build(list(hand)).rank:
+            bad.append(hand)
+    for i in xrange(samples):
+        hand = rng.sample(cards, 7)
+        if rank(hand) != poker.hand_build(list(hand)).rank:
+            bad.append(tuple(hand))
+    return bad
+
+build_tables()
+poker.ENGINES['table'] = rank
+
+
+if __name__ == '__main__':
+
+    """
+    Run the cross check against hand_build, or with "omaha", time the omaha
+    rankers against each other.
+    """
+
+    import sys
+    if sys.argv[1:2] == ['omaha']:
+        slow, fast = bench_omaha()
+        print '9 player omaha showdowns, 200 hands'
+        print 'hand_build_omaha %.3fs, rank_omaha %.3fs (%.1fx)' % (slow, fast, slow / fast)
+        sys.exit(0)
+
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    bad = crosscheck(samples)
+    for hand in bad[:20]:
+        print poker.hand_output(hand), hex(rank(hand)), hex(poker.hand_build(list(hand)).rank)
+    print '%d hands disagree' % len(bad)
+    sys.exit(1 if bad else 0)
@@ -0,0 +1,157 @@
+"""
+lowball.py
+
+Table driven rankers for lowball, where the worst poker hand wins. Both use
+the same rank layout as hand_build (a kind of hand in the top nibble, then
+the five card values, most important first) and lower still means better,
+so lowball ranks can be compared, sorted and passed to pot.award just like
+high hand ranks. Both rank 5 card hands, as dealt in draw games.
+
+2-7 (deuce to seven): aces are always high, and straights and flushes count
+against you. That is exactly high poker turned upside down, except that
+A2345 is just ace high (and not a straight), so the tables are the 5 card
+entries of lookup's tables with every rank flipped. The best hand is 75432
+offsuit.
+
+A-5 (ace to five): aces are always low, and straights and flushes don't
+count, so only pairs matter and suits can be ignored. The best hand is
+A2345, the wheel.
+
+Ranking is the same couple of lookups as lookup.rank_mask: one per suit for
+flushes (2-7 only), then one for the value key.
+"""
+
+import collections
+import itertools
+import poker
+import lookup
+
+FLUSHES_27 = {}
+RANKS_27 = {}
+RANKS_A5 = {}
+
+# the wheel, A2345, as values and as a suit mask.
+WHEEL = (13, 1, 2, 3, 4)
+WHEEL_MASK = sum(lookup.VALUE_BITS[v] for v in WHEEL)
+
+def values_rank(kind, values):
+    """
+    A rank from a kind of hand and 5 nibble values, most important first.
+    """
+    rank = kind << 20
+    for i, v in enumerate(values):
+        rank |= v << (4 * (4 - i))
+    return rank
+
+def flip(rank):
+    """
+    Turn a high hand rank upside down: the worst high hand becomes the best.
+    Flipping twice gives back the original rank.
+    """
+    return ((0xB - (rank >> 20)) << 20) | (0xFFFFF - (rank & 0xFFFFF))
+
+def a5_value(v):
+    """
+    Card value counting aces low, ace 1 up to king 13.
+    """
+    return v % 13 + 1
+
+# kinds of A-5 hand, by the counts of each value in it.
+A5_KINDS = {
+    (1, 1, 1, 1, 1): 1,
+    (2, 1, 1, 1): 2,
+    (2, 2, 1): 3,
+    (3, 1, 1): 4,
+    (3, 2): 5,
+    (4, 1): 6,
+}
+
+def build_tables():
+    """
+    Fill the lowball tables. 2-7 is worked out from lookup's tables, A-5 from
+    the value counts, so this is quick.
+    """
+    values = range(1, 14)
+    # ace high, no straight: what the wheel is in 2-7.
+    ace_high = [13 - v for v in (13, 4, 3, 2, 1)]
+    for combo in itertools.combinations(values, 5):
+        mask = sum(lookup.VALUE_BITS[v] for v in combo)
+        if mask == WHEEL_MASK:
+            FLUSHES_27[mask] = flip(values_rank(0x5, ace_high))
+        else:
+            FLUSHES_27[mask] = flip(lookup.FLUSHES[mask])
+
+    for combo in itertools.combinations_with_replacement(values, 5):
+        counts = collections.Counter(combo)
+        if max(counts.values()) > 4:
+            continue
+        key = sum(lookup.VALUE_KEYS[v] for v in combo)
+        if sorted(combo) == sorted(WHEEL):
+            RANKS_27[key] = flip(values_rank(0xA, ace_high))
+        else:
+            RANKS_27[key] = flip(lookup.RANKS[key])
+
+        low = sorted(counts, key=lambda v: (counts[v], a5_value(v)), reverse=True)
+        kind = A5_KINDS[tuple(sorted(counts.values(), reverse=True))]
+        RANKS_A5[key] = values_rank(kind, [a5_value(v) for v in low for n in range(counts[v])])
+
+def suits(mask):
+    return mask & 0x1FFF, (mask >> 13) & 0x1FFF, (mask >> 26) & 0x1FFF, mask >> 39
+
+def rank_27_mask(mask):
+    """
+    Rank a 5 card hand (as a card mask) for deuce to seven. Lower is better.
+    """
+    s0, s1, s2, s3 = suits(mask)
+    for s in (s0, s1, s2, s3):
+        if s in FLUSHES_27:
+            return FLUSHES_27[s]
+    spread = lookup.SPREAD
+    return RANKS_27[spread[s0] + spread[s1] + spread[s2] + spread[s3]]
+
+def rank_a5_mask(mask):
+    """
+    Rank a 5 card hand (as a card mask) for ace to five. Lower is better.
+    """
+    s0, s1, s2, s3 = suits(mask)
+    spread = lookup.SPREAD
+    return RANKS_A5[spread[s0] + spread[s1] + spread[s2] + spread[s3]]
+
+def rank_27(cards):
+    return rank_27_mask(poker.mask_from_cards(cards))
+
+def rank_a5(cards):
+    return rank_a5_mask(poker.mask_from_cards(cards))
+
+def low_desc(first, second):
+    """
+    Eg. "seven-five low", from the two highest card values.
+    """
+    return '%s-%s low' % (poker.VALUES[first].name, poker.VALUES[second].name)
+
+def desc_27(rank, mask=0):
+    """
+    Describe a 2-7 hand from its rank, like poker.rank_desc.
+    """
+    high = flip(rank)
+    if high >> 20 == 0xA:
+        return low_desc(13 - ((high >> 16) & 0xF), 13 - ((high >> 12) & 0xF))
+    return poker.rank_desc(high, mask)
+
+A5_NAMES = [None, 'high card', 'pair of %s', 'two pair - %s and %s', 'trip %s', 'full house - %s full of %s', 'quad %s']
+
+def desc_a5(rank, mask=0):
+    """
+    Describe an A-5 hand from its rank.
+    """
+    kind = rank >> 20
+    # back to a poker.VALUES index, where the ace is 13.
+    values = [((rank >> (4 * (4 - i))) & 0xF) - 1 or 13 for i in range(5)]
+    names = [poker.card_value_name(poker.Card(v, 0)) for v in values]
+    if kind == 1:
+        return low_desc(values[0], values[1])
+    if kind in (3, 5):
+        return A5_NAMES[kind] % (names[0], names[3] if kind == 5 else names[2])
+    return A5_NAMES[kind] % names[0]
+
+build_tables()
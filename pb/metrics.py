@@ -0,0 +1,223 @@
+"""
+metrics.py
+
+Optional instrumentation, for working out what's slow when the bot lags.
+enable() wraps the hot paths (hand evaluation, both each variant's ranker and
+building the winning hands, and dealing, drawing, showdown and output in
+Game) with timers that count calls and keep a latency
+histogram for each. Nothing is wrapped until then, so when it's off there is
+no overhead at all, and disable() puts the original functions back.
+
+Histograms have one bucket per power of two microseconds, which is plenty to
+tell a 5us call from a 5ms one, and costs one bit_length per call.
+
+The numbers can be read with stats() (the "stats" table command prints
+summary()), and written to a json file every so often with dump_every(). The
+irc output queue's depth and wait times (see outq.py) go along with them once
+it's given to watch().
+profile() runs cProfile over the next few hands and saves the result for
+pstats.
+"""
+
+import cProfile
+import json
+import time
+import irc
+import poker
+import game
+import variants
+
+# (owner, attribute) of everything instrumented, with the name it's kept as.
+# the game ranks hands with its variant's rank function, which each Variant
+# holds on to itself.
+HOOKS = [(v, 'rank', 'rank_' + name) for name, v in sorted(variants.VARIANTS.items())] + [
+    (poker, 'hand_build', 'hand_build'),
+    (poker, 'hand_build_omaha', 'hand_build_omaha'),
+    (game.Game, 'deal', 'deal'),
+    (game.Game, 'draw', 'draw'),
+    (game.Game, 'showdown', 'showdown'),
+    (game.Game, 'out', 'out'),
+]
+
+BUCKETS = 32
+
+# name -> Timer, while enabled.
+TIMERS = {}
+# (owner, attribute) -> original function, while enabled.
+ORIGINALS = {}
+# the OutQueue whose numbers are reported too, if any.
+QUEUE = None
+
+
+class Timer(object):
+    """
+    Call count, total time and latency histogram for one function.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.buckets[min(int(elapsed * 1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, p):
+        """
+        Upper bound of the bucket holding the p-th percentile, in seconds.
+        """
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen and seen >= p / 100.0 * self.count:
+                return (1 << i) / 1e6
+        return 0.0
+
+    def stats(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': self.buckets,
+        }
+
+
+def timed(fn, timer):
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timer.add(time.time() - start)
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+def enable():
+    """
+    Start timing the hooked functions.
+    """
+    for owner, attr, name in HOOKS:
+        if (owner, attr) in ORIGINALS:
+            continue
+        # through __dict__, so methods come back as plain functions.
+        fn = owner.__dict__[attr]
+        timer = TIMERS.setdefault(name, Timer(name))
+        ORIGINALS[owner, attr] = fn
+        setattr(owner, attr, timed(fn, timer))
+
+def disable():
+    """
+    Stop timing, putting the original functions back. The numbers so far are
+    kept until reset().
+    """
+    for (owner, attr), fn in ORIGINALS.items():
+        setattr(owner, attr, fn)
+    ORIGINALS.clear()
+
+def enabled():
+    return bool(ORIGINALS)
+
+def reset():
+    for name in TIMERS:
+        TIMERS[name] = Timer(name)
+    # the wrappers hold on to their timers, so wrap again.
+    if enabled():
+        disable()
+        enable()
+
+def watch(queue):
+    """
+    Report an OutQueue's numbers along with the timers.
+    """
+    global QUEUE
+    QUEUE = queue
+
+def stats():
+    return dict((name, t.stats()) for name, t in TIMERS.items())
+
+def queue_stats():
+    """
+    The watched queue's stats, with how many lines are waiting for each
+    destination. None if there's no queue.
+    """
+    if QUEUE is None:
+        return None
+    s = QUEUE.stats()
+    s['depth'] = dict((dest, QUEUE.depth(dest)) for dest in QUEUE.queues)
+    return s
+
+def summary():
+    """
+    One short line per function with any calls, and one for the queue, for
+    the stats command.
+    """
+    lines = []
+    if not TIMERS:
+        lines.append('metrics are off.')
+    for name, timer in sorted(TIMERS.items()):
+        if not timer.count:
+            continue
+        s = timer.stats()
+        lines.append('%s: %d calls, avg %.0fus, p50 <%.0fus, p99 <%.0fus, max %.1fms' % (
+            name, s['count'], 1e6 * s['mean'], 1e6 * s['p50'], 1e6 * s['p99'], 1e3 * s['max']))
+    if TIMERS and not lines:
+        lines.append('no calls yet.')
+    if QUEUE is not None:
+        lines.append(QUEUE.summary())
+    return lines
+
+def dump(path):
+    with open(path, 'w') as f:
+        json.dump({'time': time.time(), 'timers': stats(), 'outq': queue_stats()}, f, indent=4, sort_keys=True)
+
+def dump_every(path, seconds):
+    """
+    Write stats to a file now and every so often after, from the event loop.
+    """
+    dump(path)
+    return irc.call_later(seconds, dump_every, path, seconds)
+
+
+class HandProfiler(object):
+    """
+    Runs cProfile until hands more showdowns have happened (at any table),
+    then saves the profile to path.
+    """
+
+    def __init__(self, hands, path):
+        self.hands = hands
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.showdown = game.Game.__dict__['showdown']
+        profiler = self
+
+        def showdown(g):
+            profiler.showdown(g)
+            profiler.hands -= 1
+            if profiler.hands <= 0:
+                profiler.stop()
+        game.Game.showdown = showdown
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        # put back whatever showdown was, timed or not.
+        game.Game.showdown = self.showdown
+        self.profile.dump_stats(self.path)
+
+def profile(hands, path):
+    """
+    Profile the next hands hands, saving the profile to path. Read it with
+    python -m pstats path.
+    """
+    return HandProfiler(hands, path)
@@ -0,0 +1,150 @@
+"""
+outq.py
+
+Outbound message queue for irc. A single hand produces dozens of lines, and
+sending them as fast as they are made gets the bot kicked for flooding. Lines
+are queued per destination instead, and sent from the event loop at a rate
+limited by a token bucket: each message costs a token, tokens come back at
+rate per second, and up to burst can be saved up.
+
+To get more said per message, consecutive queued lines for the same place are
+merged into one message (up to max_len bytes). Destinations with an urgent
+line queued (an action prompt, which someone is waiting on) are served before
+those with only informational lines, and otherwise destinations take turns so
+one busy table can't starve the others. Lines for one destination always go
+out in order.
+
+Queue depth and how long lines waited before going out are tracked, see
+stats(), and can be printed to the console every so often with log_every().
+"""
+
+import collections
+import datetime
+import time
+import irc
+
+SEPARATOR = ' | '
+
+
+class OutQueue(object):
+
+    def __init__(self, send, rate=1.0, burst=4, max_len=400):
+        """
+        send is a function taking (destination, text) that actually sends a
+        message.
+        """
+        self.send = send
+        self.rate = rate
+        self.burst = burst
+        self.max_len = max_len
+        self.tokens = float(burst)
+        self.updated = time.time()
+        # destination -> deque of (queued time, line, urgent), in turn order.
+        self.queues = collections.OrderedDict()
+        # urgent lines queued for each destination
+        self.urgent = collections.Counter()
+        self.timer = None
+        # stats
+        self.queued = 0
+        self.sent_lines = 0
+        self.sent_messages = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def put(self, dest, line, urgent=False):
+        """
+        Queue a line for a destination. Blank lines are only spacing for the
+        console, and are dropped.
+        """
+        if not line.strip():
+            return
+        self.queues.setdefault(dest, collections.deque()).append((time.time(), line, urgent))
+        self.urgent[dest] += urgent
+        self.queued += 1
+        self.schedule(0)
+
+    def schedule(self, delay):
+        if not self.timer:
+            self.timer = irc.call_later(delay, self.pump)
+
+    def refill(self):
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pump(self):
+        """
+        Send as many messages as there are tokens for, then come back when the
+        next token is due if anything is left.
+        """
+        self.timer = None
+        self.refill()
+        while self.tokens >= 1 and self.queued:
+            dest = next((d for d in self.queues if self.urgent[d]), None)
+            if dest is None:
+                dest = next(iter(self.queues))
+            # serve it, and move it to the back of the line.
+            lines = self.queues.pop(dest)
+            self.send(dest, self.merge(dest, lines))
+            if lines:
+                self.queues[dest] = lines
+            self.tokens -= 1
+
+        if self.queued:
+            self.schedule((1 - self.tokens) / self.rate)
+
+    def merge(self, dest, lines):
+        """
+        Pop as many lines as fit in one message off a queue, and join them.
+        """
+        now = time.time()
+        parts, size = [], -len(SEPARATOR)
+        while lines:
+            length = len(lines[0][1].encode('utf-8')) + len(SEPARATOR)
+            if parts and size + length > self.max_len:
+                break
+            queued, line, urgent = lines.popleft()
+            self.urgent[dest] -= urgent
+            parts.append(line)
+            size += length
+            wait = now - queued
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        self.queued -= len(parts)
+        self.sent_lines += len(parts)
+        self.sent_messages += 1
+        return SEPARATOR.join(parts)
+
+    def depth(self, dest=None):
+        """
+        Lines waiting to go out, in total or for one destination.
+        """
+        if dest is None:
+            return self.queued
+        return len(self.queues.get(dest, ()))
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'lines': self.sent_lines,
+            'messages': self.sent_messages,
+            'wait_avg': self.wait_total / self.sent_lines if self.sent_lines else 0.0,
+            'wait_max': self.wait_max,
+        }
+
+    def summary(self):
+        """
+        The stats as one short line.
+        """
+        s = self.stats()
+        return 'outq: %d queued, %d lines in %d messages, wait avg %.1fs, max %.1fs' % (
+            s['queued'], s['lines'], s['messages'], s['wait_avg'], s['wait_max'])
+
+    def log_every(self, seconds):
+        """
+        Print the summary to the console now and every so often after, from
+        the event loop.
+        """
+        now = datetime.datetime.now()
+        print '[%02d:%02d] %s' % (now.hour, now.minute, self.summary())
+        return irc.call_later(seconds, self.log_every, seconds)
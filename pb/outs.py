@@ -0,0 +1,152 @@
+"""
+outs.py
+
+Outs for a hand on the flop or turn: every card left in the deck that would
+improve the hand to a better kind of hand (a pair to trips, a draw to a
+straight or flush...), or, if opponents' cards are known, that would take the
+hand from behind to winning outright. A card that only improves the board
+(pairing it, say) makes the same hand for everyone, and isn't an out.
+
+Nothing is built card by card. Without a flush, the rank of the hand plus a
+new card only depends on the new card's value, so the hand's value key (see
+lookup.py) is worked out once and the 13 possible values are looked up from
+it. Suits only matter where the new card would make a flush, which the
+suit masks of the hand give straight away. So working out outs is a few dozen
+table lookups, and fast enough to answer on a busy table.
+
+>>> hole = map(poker.card_from_str, ['Ah', 'Kh'])
+>>> board = map(poker.card_from_str, ['2h', '7h', 'Qc'])
+>>> o = find(hole, board)
+>>> len(o.cards), o.groups['flush - hearts']
+(15, 9)
+"""
+
+import collections
+import poker
+import lookup
+
+Outs = collections.namedtuple('Outs', 'cards groups unseen next_card by_river')
+
+KIND = 0xF00000
+
+def board_kind(mask):
+    """
+    The kind of hand (the top nibble of a rank) made by 4 or more board cards.
+    4 cards can't make a straight or flush, so only the values count.
+    """
+    if bin(mask).count('1') >= 5:
+        return lookup.rank_mask(mask) & KIND
+    # how many values there are of each count.
+    counts = collections.Counter(sum((mask >> (13 * s + v)) & 1 for s in range(4)) for v in range(13))
+    if counts[4]:
+        return 0x300000
+    if counts[3]:
+        return 0x700000
+    if counts[2] > 1:
+        return 0x800000
+    if counts[2]:
+        return 0x900000
+    return 0xA00000
+
+
+class Ranker(object):
+    """
+    Ranks of a hand with any one more card, from the hand's cards.
+    """
+
+    def __init__(self, mask):
+        self.mask = mask
+        self.suits = [(mask >> (13 * s)) & 0x1FFF for s in range(4)]
+        key = sum(lookup.SPREAD[s] for s in self.suits)
+        # the flush already made, if any.
+        self.flush = [lookup.FLUSHES[s] for s in self.suits if s in lookup.FLUSHES]
+        # (a value the hand already has four of can't come, and gets None.)
+        self.values = [None] + [lookup.RANKS.get(key + lookup.VALUE_KEYS[v]) for v in range(1, 14)]
+
+    def rank(self, i):
+        """
+        The rank with card int i added.
+        """
+        suit, value = divmod(i, 13)
+        made = self.suits[suit] | (1 << value)
+        if made in lookup.FLUSHES:
+            return lookup.FLUSHES[made]
+        if self.flush:
+            return self.flush[0]
+        return self.values[value + 1]
+
+
+def odds(outs, unseen, cards):
+    """
+    Percent chance of hitting at least one of outs in the next cards cards.
+    """
+    if not unseen:
+        return 0.0
+    miss = 1.0
+    for i in range(cards):
+        miss *= float(unseen - outs - i) / (unseen - i)
+    return 100.0 * (1.0 - max(miss, 0.0))
+
+def find(hole, board, opponents=[]):
+    """
+    Find the outs for hole cards on a board of 3 or 4 cards, optionally
+    against opponents' known hole cards. Returns Outs, with
+        cards       the outs, as Cards
+        groups      the number of outs making each hand, by description
+        unseen      the number of cards left that could come
+        next_card   percent chance of hitting an out on the next card
+        by_river    percent chance of hitting one by the river
+    """
+    assert 3 <= len(board) <= 4
+    board_mask = poker.mask_from_cards(board)
+    mask = board_mask | poker.mask_from_cards(hole)
+    seen = mask
+    for h in opponents:
+        seen |= poker.mask_from_cards(h)
+
+    hand = Ranker(mask)
+    rank = lookup.rank_mask(mask)
+    rivals = [Ranker(board_mask | poker.mask_from_cards(h)) for h in opponents]
+    winning = rivals and rank < min(lookup.rank_mask(r.mask) for r in rivals)
+
+    cards = []
+    groups = collections.Counter()
+    for i in range(52):
+        if seen & lookup.BITS[i]:
+            continue
+        new = hand.rank(i)
+        if rivals:
+            # an out only counts if it turns a hand that isn't winning into
+            # one that is.
+            if winning or new >= min(r.rank(i) for r in rivals):
+                continue
+        elif new & KIND >= min(rank & KIND, board_kind(board_mask | lookup.BITS[i])):
+            continue
+        cards.append(poker.CARDS[i])
+        groups[poker.rank_desc(new, mask | lookup.BITS[i])] += 1
+
+    unseen = 52 - bin(seen).count('1')
+    to_come = 5 - len(board)
+    return Outs(cards, groups, unseen, odds(len(cards), unseen, 1), odds(len(cards), unseen, to_come))
+
+
+if __name__ == '__main__':
+
+    """
+    Print the outs for a hand. Eg.
+
+    python outs.py AhKh | 2h7hQc
+    python outs.py AhKh QsQd | 2h7hQc
+    """
+
+    import sys
+    args = ' '.join(sys.argv[1:]).split('|')
+    split = lambda s: [poker.card_from_str(s[i:i+2]) for i in range(0, len(s), 2)]
+    holes = [split(h) for h in args[0].split()]
+    board = split(args[1].replace(' ', ''))
+
+    o = find(holes[0], board, holes[1:])
+    print '%d outs: %s' % (len(o.cards), poker.hand_output(o.cards))
+    for desc, n in o.groups.most_common():
+        print '  %2d %s' % (n, desc)
+    print '%.1f%% on the next card, %.1f%% by the river' % (o.next_card, o.by_river)
@@ -4,7 +4,12 @@ class Player(object):
         self.name = name
         self.cards = []
         self.hand = None
+        self.mask = 0
+        self.rank = None
         self.status = 0
         self.stack = 1000
         self.current_bet = 0
+        self.total_bet = 0
+        self.folded = False
+        self.allin = False
         self.button = ''
\ No newline at end of file
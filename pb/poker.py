@@ -10,10 +10,11 @@ import itertools
 import random
 import collections
 
-def deck():
+def deck(rng=random):
     """
     A simple deck generator used to deal from a single deck of 52 cards.
     If the end of the deck is reached, a StopIteration exception will be thrown.
+    Pass a random.Random as rng to shuffle from its own seeded stream.
         
     # create the generator
     >>> d = deck() 
@@ -30,15 +31,206 @@ def deck():
     >>> hand = [card for i, card in zip(d, range(5))] 
     [Q♡] [3♡] [8♢] [9♢] [6♡]    
     """    
-    cards = [Card(i,j) for j in range(4) for i in range(1,14)]
-    random.shuffle(cards)
+    cards = list(CARDS)
+    rng.shuffle(cards)
     for c in cards:
         yield c
 
+def deck_ints(rng=random):
+    """
+    Same as deck, but deals card ints (see card_to_int) instead of Cards.
+    Shuffles identically to deck for the same random seed.
+    """
+    cards = range(52)
+    rng.shuffle(cards)
+    for c in cards:
+        yield c
+
+class Deck(object):
+    """
+    A reusable deck. The 52 shared Cards are never copied: the deck only
+    keeps a list of card ints, and shuffles it lazily as cards are dealt (one
+    step of a Fisher-Yates shuffle per card), so dealing hold 'em to a full
+    table shuffles 23 cards, not 52. reset puts the cards back without
+    allocating anything.
+
+    Each deck draws from its own random stream, and reset(seed) reseeds it,
+    so the same seed always deals the same cards in the same order.
+
+    >>> d = Deck()
+    >>> d.reset(1234, dead=[card_to_int(Card(13, 0))])
+    >>> d.remaining()
+    51
+    >>> hand = d.deal(2)
+    """
+
+    def __init__(self, rng=None):
+        self.rng = rng or random.Random()
+        self.order = range(52)
+        self.dealt = 0
+        self.size = 52
+
+    def reset(self, seed=None, dead=()):
+        """
+        Put every card back, reseeding the random stream if a seed is given,
+        and take out the dead card ints.
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        self.order[:] = ORDER
+        self.dealt = 0
+        self.size = 52
+        if dead:
+            self.remove(dead)
+
+    def remove(self, ints):
+        """
+        Take known cards (as ints) out of the cards still to be dealt, eg.
+        cards seen in other hands when working out equity.
+        """
+        order = self.order
+        for c in ints:
+            i = order.index(c, self.dealt, self.size)
+            self.size -= 1
+            order[i], order[self.size] = order[self.size], order[i]
+
+    def next_int(self):
+        """
+        Deal one card int.
+        """
+        i = self.dealt
+        if i >= self.size:
+            raise StopIteration
+        order = self.order
+        j = i + int(self.rng.random() * (self.size - i))
+        order[i], order[j] = order[j], order[i]
+        self.dealt = i + 1
+        return order[i]
+
+    def next(self):
+        """
+        Deal one Card, same as the deck generator.
+        """
+        return CARDS[self.next_int()]
+
+    def __iter__(self):
+        return self
+
+    def deal_ints(self, n):
+        """
+        Deal n card ints at once, quicker than one at a time.
+        """
+        i, size, order, random = self.dealt, self.size, self.order, self.rng.random
+        if i + n > size:
+            raise StopIteration
+        for i in range(i, i + n):
+            j = i + int(random() * (size - i))
+            order[i], order[j] = order[j], order[i]
+        self.dealt += n
+        return order[self.dealt - n:self.dealt]
+
+    def deal(self, n):
+        return [CARDS[c] for c in self.deal_ints(n)]
+
+    def remaining(self):
+        return self.size - self.dealt
+
 Card = collections.namedtuple('Card', 'value suit')
-Hand = collections.namedtuple('Hand', 'rank cards desc')
 Symbol = collections.namedtuple('Symbol', 'symbol name')
 
+class Hand(object):
+    """
+    A ranked hand: rank, the 5 cards making it, and a description. Only the
+    rank is needed to compare hands, so a Hand can also be made lazily from a
+    rank and the cards it was ranked from (source), and cards and desc are
+    only worked out the first time they're asked for. (see hand_eval)
+
+    Works like the (rank, cards, desc) tuple it used to be: it can be
+    unpacked, indexed, compared and sorted, in the same order.
+
+    >>> rng = random.Random(0)
+    >>> hands = [hand_eval(rng.sample(CARDS, 7)) for i in range(1000)]
+    >>> sorted(hands) == sorted(tuple(h) for h in hands)
+    True
+    """
+    __slots__ = ('rank', '_cards', '_desc', 'source')
+
+    def __init__(self, rank, cards=None, desc=None, source=None):
+        self.rank = rank
+        self._cards = cards
+        self._desc = desc
+        self.source = source
+
+    @property
+    def cards(self):
+        if self._cards is None:
+            self._cards = hand_build(list(self.source)).cards if self.source else []
+        return self._cards
+
+    @property
+    def desc(self):
+        if self._desc is None:
+            self._desc = rank_desc(self.rank, mask_from_cards(self.source)) if self.source else ''
+        return self._desc
+
+    def __iter__(self):
+        return iter((self.rank, self.cards, self.desc))
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, i):
+        return (self.rank, self.cards, self.desc)[i]
+
+    def compare(self, other):
+        """
+        cmp() of this hand and a Hand or (rank, cards, desc) tuple, as
+        tuples, only building cards and desc when the ranks match.
+        NotImplemented for anything else.
+        """
+        if isinstance(other, Hand):
+            rank = other.rank
+        elif isinstance(other, tuple) and len(other) == 3:
+            rank = other[0]
+        else:
+            return NotImplemented
+        if self.rank != rank:
+            return cmp(self.rank, rank)
+        return cmp(tuple(self), tuple(other))
+
+    def __eq__(self, other):
+        c = self.compare(other)
+        return c if c is NotImplemented else c == 0
+
+    def __ne__(self, other):
+        c = self.compare(other)
+        return c if c is NotImplemented else c != 0
+
+    def __lt__(self, other):
+        c = self.compare(other)
+        return c if c is NotImplemented else c < 0
+
+    def __le__(self, other):
+        c = self.compare(other)
+        return c if c is NotImplemented else c <= 0
+
+    def __gt__(self, other):
+        c = self.compare(other)
+        return c if c is NotImplemented else c > 0
+
+    def __ge__(self, other):
+        c = self.compare(other)
+        return c if c is NotImplemented else c >= 0
+
+    def __repr__(self):
+        return 'Hand(rank=%r, cards=%r, desc=%r)' % tuple(self)
+
+# every card in the deck, created once and shared. the index of a card in this
+# list is its int representation. (see card_to_int)
+CARDS = [Card(i,j) for j in range(4) for i in range(1,14)]
+# card ints in order, for putting a Deck back together.
+ORDER = tuple(range(52))
+
 VALUES = [
     Symbol('A', 'low ace'),
     Symbol('2', 'duece'),
@@ -105,6 +297,126 @@ def card_from_str(str):
     else:
         return None
 
+
+"""
+INT AND MASK CARDS
+
+Cards can also be represented as a single int from 0 to 51, which is simply
+the index of the card in CARDS: suit * 13 + value - 1. A whole hand (or board,
+or deck) can then be stored as one 52-bit mask with bit n set for card n, so
+combining a board with hole cards is a bitwise OR, and checking for shared
+cards is a bitwise AND.
+
+Each suit occupies 13 consecutive bits of a mask, with the duece as the
+lowest bit, so (mask >> 13 * suit) & 0x1FFF gives the values held in a suit.
+"""
+
+def card_to_int(card):
+    # low aces (from chk_straight) are still just aces.
+    return card.suit * 13 + (card.value or 13) - 1
+
+def card_from_int(i): return CARDS[i]
+def int_output(i): return card_output(CARDS[i])
+
+def int_from_str(str):
+    """
+    Creates a card int from a string like "Ah" or "5c"
+    """
+    card = card_from_str(str)
+    if card:
+        return card_to_int(card)
+    else:
+        return None
+
+def mask_from_cards(cards):
+    mask = 0
+    for c in cards:
+        mask |= 1 << card_to_int(c)
+    return mask
+
+def mask_from_ints(ints):
+    mask = 0
+    for i in ints:
+        mask |= 1 << i
+    return mask
+
+def mask_to_ints(mask):
+    """
+    The card ints in a mask, from lowest to highest.
+    """
+    ints = []
+    while mask:
+        low = mask & -mask
+        ints.append(low.bit_length() - 1)
+        mask ^= low
+    return ints
+
+def mask_to_cards(mask): return [CARDS[i] for i in mask_to_ints(mask)]
+def mask_output(mask, total=0): return hand_output(mask_to_cards(mask), total)
+
+
+"""
+SUIT ISOMORPHISM
+
+Suits have no rank, so two situations that only differ by relabeling the
+suits (AhKh on Qh7h2c is the same as AsKs on Qs7s2d) play out identically.
+canonical maps a situation to one representative of all its relabelings, so
+caches and tables only need one entry for each.
+
+Suits are relabeled in order of what they hold: the suit with the most (and
+highest) board cards becomes suit 0, and so on, using the hole cards to break
+ties. Suits holding exactly the same values are interchangeable, so it
+doesn't matter which of them comes first.
+"""
+
+def canonical_suits(groups):
+    """
+    Work out the canonical suit relabeling for a list of card groups, eg.
+    [board, hole]. Earlier groups take priority. Returns a list perm where
+    perm[suit] is the new suit.
+    """
+    def held(suit):
+        values = [[c.value for c in g if c.suit == suit] for g in groups]
+        return [(len(v), sorted(v, reverse=True)) for v in values]
+    order = sorted(range(4), key=held, reverse=True)
+    perm = [0] * 4
+    for new, old in enumerate(order):
+        perm[old] = new
+    return perm
+
+def suits_permute(cards, perm):
+    """
+    Relabel the suits of a list of cards, sorted high to low.
+    """
+    cards = [Card(c.value, perm[c.suit]) for c in cards]
+    cards.sort(key=lambda c: (c.value, -c.suit), reverse=True)
+    return cards
+
+def suits_inverse(perm):
+    inverse = [0] * 4
+    for old, new in enumerate(perm):
+        inverse[new] = old
+    return inverse
+
+def canonical(hole, board):
+    """
+    Map hole cards and a board to their canonical suits. Returns the new hole
+    cards, the new board and the suit relabeling used (see uncanonical).
+
+    >>> hole, board, perm = canonical(map(card_from_str, ['5c', 'Ad']), map(card_from_str, ['2d', 'Td', 'Kh']))
+    >>> hand_output(hole), hand_output(board)
+    ([A♡] [5♣], [K♢] [T♡] [2♡])
+    """
+    perm = canonical_suits([board, hole])
+    return suits_permute(hole, perm), suits_permute(board, perm), perm
+
+def uncanonical(cards, perm):
+    """
+    Map canonical cards back to the original suits, given the relabeling
+    returned by canonical.
+    """
+    return suits_permute(cards, suits_inverse(perm))
+
         
 def chk_straight(cards):
     """
@@ -230,7 +542,8 @@ def hand_build(cards):
     trips = [g for g in vgroup_values if len(g) == 3]
     quads = [g for g in vgroup_values if len(g) == 4]
     flush = [g for g in sgroups.values() if len(g) >= 5]
-    full_house = trips and pairs
+    # two sets in one hand also make a boat, the lower set plays as the pair.
+    full_house = trips and (pairs or len(trips) > 1)
     two_pair = len(pairs) >= 2            
     # check for straights
     straight = chk_straight(cards)
@@ -262,9 +575,10 @@ def hand_build(cards):
         rank, desc = HANDS[2][0], HANDS[2][1] % card_value_name(quads[0][0])
         
     elif full_house:
-        hand += trips[0] + pairs[0]
+        boat = sorted(pairs + [t[:2] for t in trips[1:]], key=lambda g: g[0].value, reverse=True)
+        hand += trips[0] + boat[0]
         rank, desc = HANDS[3][0], HANDS[3][1] % \
-            (card_value_name(trips[0][0]), card_value_name(pairs[0][0]))
+            (card_value_name(trips[0][0]), card_value_name(boat[0][0]))
             
     elif flush:
         hand += flush[0][:5]
@@ -307,9 +621,32 @@ def hand_build(cards):
         
     return Hand(rank, hand, desc)
     
-    
-    
-def hand_build_omaha(hole, board):
+
+def rank_desc(rank, mask=0):
+    """
+    Describe a hand from its rank alone, the same way hand_build would. The
+    rank holds the hand type and every card value in it, but not suits, so
+    flushes also need the card mask of the hand to name the suit.
+    """
+    kind = (rank >> 20) - 1
+    values = [Card(13 - ((rank >> (4 * (4-i))) & 0xF), 0) for i in range(5)]
+    template = HANDS[kind][1]
+    if kind in (0, 1):
+        return template
+    elif kind == 3:
+        return template % (card_value_name(values[0]), card_value_name(values[3]))
+    elif kind == 4:
+        suit = [s for s in range(4) if bin((mask >> (13 * s)) & 0x1FFF).count('1') >= 5]
+        return template % card_suit_name(Card(0, suit[0] if suit else 0))
+    elif kind == 5 or kind == 9:
+        return template % card_value_name(values[0], False)
+    elif kind == 7:
+        return template % (card_value_name(values[0]), card_value_name(values[2]))
+    return template % card_value_name(values[0])
+    
+    
+    
+def hand_build_omaha(hole, board, engine=None):
     """
     Analyze and rank a 9-card OMAHA hand. Omaha hands have the tricky requirement
     that they be built using EXACTLY two of the four hole cards, and three of
@@ -321,20 +658,21 @@ def hand_build_omaha(hole, board):
     possible combinations of board cards)
     
     Each 5-card hand is then fed through the ranker, and then the best one is 
-    selected and returned.
+    selected and returned. engine picks the ranker, like hand_rank.
     """    
     
     assert len(hole) == 4
     assert len(board) == 5
     
-    best = Hand([], 0xFFFFFF, '')
+    best = Hand(0xFFFFFF, [], '')
     
     # 6 combinations of hole cards
     hole_hands = [list(c) for c in itertools.combinations(hole, 2)]     
     # 10 combinations of house cards
     board_hands = [list(c) for c in itertools.combinations(board, 3)] 
-    # and total possible hands is the product of both sets
-    hands = (hand_build(a+b) for a, b in itertools.product(hole_hands, board_hands))
+    # and total possible hands is the product of both sets. only the rank is
+    # needed to compare them, the winner's cards are built when asked for.
+    hands = (hand_eval(a+b, engine) for a, b in itertools.product(hole_hands, board_hands))
     
     # test each hand, find the lowest rank.
     for h in hands:
@@ -344,6 +682,50 @@ def hand_build_omaha(hole, board):
     return best
 
 
+# rank engines used by hand_rank. "reference" is hand_build itself, "table"
+# is the precomputed lookup ranker, which registers itself here when
+# lookup.py is imported.
+ENGINES = {
+    'reference': lambda cards: hand_build(list(cards)).rank,
+}
+ENGINE = 'table'
+
+def load_table_engine():
+    import lookup
+    # when this file is run as a script, lookup registers itself with the
+    # poker module it imports, which isn't this one.
+    ENGINES.setdefault('table', lookup.rank)
+
+def set_engine(name):
+    """
+    Pick the engine hand_rank uses by default. Either "reference" or "table".
+    """
+    global ENGINE
+    if name not in ENGINES:
+        load_table_engine()
+    if name not in ENGINES:
+        raise ValueError('unknown engine %r' % name)
+    ENGINE = name
+
+def hand_eval(cards, engine=None):
+    """
+    Like hand_build, but lazy: ranks the cards with hand_rank, and returns a
+    Hand that builds its cards and description only if they're used.
+    """
+    return Hand(hand_rank(cards, engine), source=list(cards))
+
+def hand_rank(cards, engine=None):
+    """
+    Rank a list of 5 to 7 cards without building the full Hand. Returns the
+    same integer as hand_build(cards).rank, but the table engine is many
+    times faster, so use this whenever only the rank is needed.
+    """
+    engine = engine or ENGINE
+    if engine not in ENGINES:
+        load_table_engine()
+    return ENGINES[engine](cards)
+
+
 if __name__ == '__main__':
 
     """
@@ -0,0 +1,85 @@
+"""
+pot.py
+
+Main and side pot resolution. Every player's total contribution to the hand
+is tracked on the Player (total_bet), along with whether they folded or went
+all-in. At showdown the contributions are sorted once, and a pot is closed off
+at every all-in amount: each pot holds the slice of everyone's chips between
+the previous all-in level and this one, and can only be won by players who
+didn't fold and put in at least that much.
+
+Because the players able to win each pot are always those at or above some
+point in the sorted order, the pots are awarded from the top (smallest group)
+down while keeping a running best hand, so hands are never compared more than
+once per player.
+"""
+
+import collections
+
+Pot = collections.namedtuple('Pot', 'amount start')
+Award = collections.namedtuple('Award', 'amount winners')
+
+def side_pots(players):
+    """
+    Split the chips put in by players into pots. Returns the players sorted by
+    contribution, and a list of Pots, main pot first. Players from order[start]
+    on who haven't folded are eligible for a pot.
+    """
+    order = sorted(players, key=lambda p: p.total_bet)
+    pots = []
+    prev, level, amount, start = 0, 0, 0, None
+    for i, p in enumerate(order):
+        # the slice of chips between the last contribution and this one, from
+        # everyone who put in at least this much.
+        amount += (p.total_bet - prev) * (len(order) - i)
+        prev = p.total_bet
+        # the first player who put in more than the last pot's level.
+        if start is None and p.total_bet > level:
+            start = i
+        if amount and ((p.allin and not p.folded) or i == len(order) - 1):
+            pots.append(Pot(amount, start))
+            level, amount, start = p.total_bet, 0, None
+    return order, pots
+
+def award(players, seat):
+    """
+    Work out who wins what. Every player that hasn't folded must have a rank.
+    Odd chips from a split go one at a time to the winners in seat order,
+    seat being a function giving a player's seat. Returns a list of Awards,
+    one for each pot, main pot first, with winners as (player, chips) pairs.
+    """
+    order, pots = side_pots(players)
+    awards = []
+    best, winners = None, []
+    i = len(order)
+    carry = 0
+    # chips only contested by folded players fall through to the pot below,
+    # and finally to the best hand left at the table.
+    for start, amount in [(p.start, p.amount) for p in reversed(pots)] + [(0, 0)]:
+        amount += carry
+        carry = 0
+        # grow the group of eligible players down to this pot's start.
+        while i > start:
+            i -= 1
+            p = order[i]
+            if p.folded:
+                continue
+            if best is None or p.rank < best:
+                best, winners = p.rank, [p]
+            elif p.rank == best:
+                winners.append(p)
+
+        if not amount:
+            continue
+        if not winners:
+            carry = amount
+            continue
+
+        split, odd = divmod(amount, len(winners))
+        shares = []
+        for n, p in enumerate(sorted(winners, key=seat)):
+            shares.append((p, split + (1 if n < odd else 0)))
+        awards.append(Award(amount, shares))
+
+    awards.reverse()
+    return awards
@@ -0,0 +1,177 @@
+# coding: utf-8
+"""
+preflop.py
+
+Precomputed preflop all-in equities. There are only 169 different starting
+hands once suits are ignored (13 pairs, 78 suited and 78 offsuit), so every
+heads up matchup fits in a 169 x 169 table. The table is generated once
+(slowly) with the batch ranker and written to a small binary file, which the
+bot maps into memory with mmap at startup (see [preflop] in options.ini), and
+uses to call the odds when two players are all-in before the flop. Lookups
+are then a single read, and the pages are shared by every process that maps
+the same file.
+
+FILE FORMAT
+
+    4 bytes    magic, "PBPF"
+    2 bytes    version (1)
+    2 bytes    number of hand classes (169)
+    then 169 x 169 unsigned shorts, row major, little endian. Row a, column b
+    holds the equity of class a against class b, scaled so 65535 is 100%.
+
+>>> table = load('preflop.bin')
+>>> table.equity(map(poker.card_from_str, ['Ah', 'Kh']), map(poker.card_from_str, ['Qs', 'Qd']))
+45.9494926375
+"""
+
+import itertools
+import mmap
+import multiprocessing
+import struct
+import poker
+
+MAGIC = 'PBPF'
+VERSION = 1
+CLASSES = 169
+HEADER = struct.Struct('<4sHH')
+SCALE = 65535.0
+
+def hand_class(cards):
+    """
+    The starting hand class (0 to 168) of two hole cards. Classes are laid out
+    on a 13 x 13 grid by card value: pairs on the diagonal, suited hands with
+    the high card as the row, offsuit hands with the low card as the row.
+    """
+    a, b = cards
+    high, low = max(a.value, b.value), min(a.value, b.value)
+    if a.suit == b.suit:
+        return (high - 1) * 13 + low - 1
+    return (low - 1) * 13 + high - 1
+
+def class_name(n):
+    """
+    Eg. "AKs", "T9o" or "77".
+    """
+    row, col = divmod(n, 13)
+    high, low = poker.VALUES[max(row, col) + 1].symbol, poker.VALUES[min(row, col) + 1].symbol
+    if row == col:
+        return high + low
+    return high + low + ('s' if row > col else 'o')
+
+def class_combos():
+    """
+    Every pair of card ints in each hand class, as a list indexed by class.
+    """
+    combos = [[] for n in range(CLASSES)]
+    for a, b in itertools.combinations(range(52), 2):
+        combos[hand_class([poker.CARDS[a], poker.CARDS[b]])].append((a, b))
+    return combos
+
+def generate_row(args):
+    """
+    Worker for generate(). Equity of class a against every class b >= a,
+    each from trials random deals of a concrete combo pair and a board, all
+    ranked at once with numpy (see batch.py).
+    """
+    # numpy is only needed to build a table, not to read one.
+    import numpy
+    import batch
+    a, trials, seed = args
+    rng = numpy.random.RandomState(seed)
+    combos = class_combos()
+    rows = numpy.arange(trials)[:, None]
+    row = []
+    for b in range(a, CLASSES):
+        pairs = numpy.array([x + y for x in combos[a] for y in combos[b] if not set(x) & set(y)], dtype=numpy.intp)
+        hands = pairs[rng.randint(len(pairs), size=trials)]
+        # shuffle the deck for every deal, with the hole cards pushed to the
+        # back, and take the first 5 for the board.
+        keys = rng.random_sample((trials, 52))
+        keys[rows, hands] = 2.0
+        board = numpy.argpartition(keys, 4, axis=1)[:, :5]
+        rx = batch.rank(numpy.hstack([hands[:, :2], board]))
+        ry = batch.rank(numpy.hstack([hands[:, 2:], board]))
+        row.append(((rx < ry).sum() + 0.5 * (rx == ry).sum()) / float(trials))
+    return a, row
+
+def generate(path, trials=50000, workers=None, seed=0):
+    """
+    Build the full table with trials random deals per matchup, spread across
+    a pool of processes, one row at a time, and write it to path. Slow: with
+    the default 50000 trials it takes about 40 minutes of cpu, and equities
+    are within about half a percent.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers)
+    try:
+        rows = pool.map(generate_row, [(a, trials, seed * 1000 + a) for a in range(CLASSES)])
+    finally:
+        pool.close()
+        pool.join()
+
+    table = [[0.5] * CLASSES for a in range(CLASSES)]
+    for a, row in rows:
+        for i, e in enumerate(row):
+            b = a + i
+            if a != b:
+                table[a][b] = e
+                table[b][a] = 1.0 - e
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, CLASSES))
+        for row in table:
+            f.write(struct.pack('<%dH' % CLASSES, *[int(round(e * SCALE)) for e in row]))
+
+class Table(object):
+    """
+    A preflop table mapped from disk.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, classes = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or classes != CLASSES:
+            raise ValueError('%s is not a preflop table' % path)
+
+    def class_equity(self, a, b):
+        """
+        Equity (percent) of hand class a against class b.
+        """
+        offset = HEADER.size + 2 * (a * CLASSES + b)
+        return 100.0 * struct.unpack_from('<H', self.map, offset)[0] / SCALE
+
+    def equity(self, hole, other):
+        """
+        Equity (percent) of two hole cards against two others, as dealt by
+        Game.deal.
+        """
+        return self.class_equity(hand_class(hole), hand_class(other))
+
+    def close(self):
+        self.map.close()
+
+TABLES = {}
+
+def load(path):
+    """
+    Map a table file, once per process.
+    """
+    if path not in TABLES:
+        TABLES[path] = Table(path)
+    return TABLES[path]
+
+
+if __name__ == '__main__':
+
+    """
+    Generate a table. python preflop.py preflop.bin [trials]
+    """
+
+    import sys
+    import time
+    path = sys.argv[1] if len(sys.argv) > 1 else 'preflop.bin'
+    trials = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    start = time.time()
+    generate(path, trials)
+    print 'wrote %s in %.1fs' % (path, time.time() - start)
@@ -0,0 +1,257 @@
+"""
+ranges.py
+
+Hand ranges, and range against range equity. A range is written the usual
+way, as a comma separated list of
+
+    QQ      a pair                  AKs     suited         AKo     offsuit
+    QQ+     QQ or better            AK      suited or offsuit
+    QQ-88   pairs from QQ to 88     A2s+    A2s up to AKs
+    AhKh    one exact hand          KTs-K7s KTs down to K7s
+
+and any of these can be weighted with a colon, eg. "AKo:0.5" for half of the
+offsuit combos. A range is expanded into combos: pairs of card ints (see
+poker.card_to_int), each with a weight.
+
+Equity works board by board. For each board every combo in both ranges is
+ranked once, as one batched array (see batch.py), and then every matchup is
+just a comparison of two ranks, weighted by both combos' weights. Combos that
+share a card with each other, the board or the dead cards are left out. On
+the turn or river every board is dealt, from the flop back only trials random
+boards are, split between a pool of worker processes like equity.py.
+
+>>> len(parse('QQ+,AKs'))
+22
+>>> for e in range_equity('QQ+,AKs', '22+,A2s+', trials=20000, seed=1): print e
+Equity(win=69.45303163500301, tie=1.83292702708275, equity=70.36949514854439, error=0.14235315770102416)
+Equity(win=28.714041337914235, tie=1.83292702708275, equity=29.630504851455612, error=0.14235315770102416)
+"""
+
+import itertools
+import multiprocessing
+import random
+import numpy
+import poker
+import lookup
+import batch
+from equity import Equity, combinations_count
+
+SYMBOLS = '23456789TJQKA'
+
+def value(symbol):
+    """
+    Card value (1 for a duece to 13 for an ace) of a symbol.
+    """
+    i = SYMBOLS.find(symbol.upper())
+    if i < 0:
+        raise ValueError('bad card value %r' % symbol)
+    return i + 1
+
+def value_combos(high, low, suited):
+    """
+    Every combo of two values, suited True, False or None for both.
+    """
+    combos = []
+    for s, t in itertools.product(range(4), repeat=2):
+        if high == low and s >= t:
+            continue
+        if high != low and suited is not None and (s == t) != suited:
+            continue
+        combos.append((s * 13 + high - 1, t * 13 + low - 1))
+    return combos
+
+def parse_part(part):
+    """
+    Expand one part of a range (without its weight) into combos.
+    """
+    if len(part) == 4 and part[1].isalpha() and part[3].isalpha() and part[1].lower() in 'hdcs':
+        cards = [poker.card_from_str(part[:2]), poker.card_from_str(part[2:])]
+        if None in cards or cards[0] == cards[1]:
+            raise ValueError('bad hand %r' % part)
+        return [tuple(poker.card_to_int(c) for c in cards)]
+
+    if '-' in part:
+        top, bottom = part.split('-')
+        if len(top) < 2 or len(bottom) < 2 or top[2:] != bottom[2:]:
+            raise ValueError('bad range part %r' % part)
+        suited = {'s': True, 'o': False}.get(top[2:3])
+        high, low = value(top[0]), value(top[1])
+        end = value(bottom[1])
+        if high == low:
+            if value(bottom[0]) != end:
+                raise ValueError('bad range part %r' % part)
+            # either way round, eg. QQ-88 or 88-QQ.
+            pairs = range(min(end, low), max(end, low) + 1)
+            return sum((value_combos(v, v, None) for v in pairs), [])
+        if value(bottom[0]) != high:
+            raise ValueError('bad range part %r' % part)
+        kickers = range(min(end, low), max(end, low) + 1)
+        return sum((value_combos(high, k, suited) for k in kickers), [])
+
+    plus = part.endswith('+')
+    part = part.rstrip('+')
+    if len(part) < 2 or part[2:] not in ('', 's', 'o'):
+        raise ValueError('bad range part %r' % part)
+    suited = {'s': True, 'o': False}.get(part[2:])
+    high, low = value(part[0]), value(part[1])
+    high, low = max(high, low), min(high, low)
+    if high == low:
+        pairs = range(low, 14) if plus else [low]
+        return sum((value_combos(v, v, None) for v in pairs), [])
+    kickers = range(low, high) if plus else [low]
+    return sum((value_combos(high, k, suited) for k in kickers), [])
+
+def parse(text):
+    """
+    Expand a range into a list of (card int, card int, weight). A combo named
+    more than once gets the weight it was given last.
+    """
+    weights = {}
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        weight = 1.0
+        if ':' in part:
+            part, weight = part.split(':')
+            weight = float(weight)
+        for a, b in parse_part(part):
+            weights[min(a, b), max(a, b)] = weight
+    return [(a, b, w) for (a, b), w in sorted(weights.items()) if w > 0]
+
+def remove_blocked(combos, cards):
+    """
+    Drop the combos using any of the given Cards.
+    """
+    used = poker.mask_from_cards(cards)
+    return [c for c in combos if not used & (lookup.BITS[c[0]] | lookup.BITS[c[1]])]
+
+
+def score_boards(args):
+    """
+    Worker for range_equity(). Scores either a list of boards (as lists of
+    card ints), or count random boards dealt from live with seed. Returns the
+    summed win, tie and total matchup weights, and the sum and sum of squares
+    of each board's equity, for the first range.
+    """
+    ints1, ints2, weights, board, boards, live, count, seed = args
+    masks1 = batch.CARD_BITS[ints1].sum(axis=1)
+    masks2 = batch.CARD_BITS[ints2].sum(axis=1)
+    if boards is None:
+        rng = random.Random(seed)
+        need = 5 - len(board)
+        boards = (board + rng.sample(live, need) for i in xrange(count))
+
+    win = tie = total = 0.0
+    shares = squares = 0.0
+    n = 0
+    for cards in boards:
+        mask = numpy.uint64(poker.mask_from_ints(cards))
+        rows1 = numpy.flatnonzero((masks1 & mask) == 0)
+        rows2 = numpy.flatnonzero((masks2 & mask) == 0)
+        if not len(rows1) or not len(rows2):
+            continue
+        cards = numpy.array(cards, dtype=numpy.intp)
+        ranks1 = batch.rank(numpy.hstack([ints1[rows1], numpy.tile(cards, (len(rows1), 1))]))
+        ranks2 = batch.rank(numpy.hstack([ints2[rows2], numpy.tile(cards, (len(rows2), 1))]))
+        w = weights[numpy.ix_(rows1, rows2)]
+        board_total = w.sum()
+        if not board_total:
+            continue
+        board_win = w[ranks1[:, None] < ranks2[None, :]].sum()
+        board_tie = w[ranks1[:, None] == ranks2[None, :]].sum()
+        win += board_win
+        tie += board_tie
+        total += board_total
+        share = (board_win + board_tie / 2.0) / board_total
+        shares += share
+        squares += share * share
+        n += 1
+    return win, tie, total, shares, squares, n
+
+def range_equity(range1, range2, board=[], dead=[], trials=10000, workers=None, seed=None):
+    """
+    Equity of one range against another. Ranges can be text (see parse) or
+    already parsed lists of combos. board and dead are Cards, like equity().
+    Returns an Equity for each range. error is the half width of the 95%
+    confidence interval over the boards dealt, and 0 when every board was.
+    """
+    if isinstance(range1, basestring):
+        range1 = parse(range1)
+    if isinstance(range2, basestring):
+        range2 = parse(range2)
+    range1 = remove_blocked(range1, board + dead)
+    range2 = remove_blocked(range2, board + dead)
+    if not range1 or not range2:
+        raise ValueError('nothing left in a range')
+
+    ints1 = numpy.array([(a, b) for a, b, w in range1], dtype=numpy.intp)
+    ints2 = numpy.array([(a, b) for a, b, w in range2], dtype=numpy.intp)
+    # the weight of every matchup, 0 where the two combos share a card.
+    masks1 = batch.CARD_BITS[ints1].sum(axis=1)
+    masks2 = batch.CARD_BITS[ints2].sum(axis=1)
+    weights = numpy.outer([w for a, b, w in range1], [w for a, b, w in range2])
+    weights[(masks1[:, None] & masks2[None, :]) != 0] = 0
+
+    board = map(poker.card_to_int, board)
+    used = poker.mask_from_ints(board) | poker.mask_from_cards(dead)
+    live = [i for i in range(52) if not used & lookup.BITS[i]]
+    need = 5 - len(board)
+
+    if seed is None:
+        seed = random.getrandbits(16)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    exhaustive = combinations_count(len(live), need) <= trials
+    if exhaustive:
+        boards = [board + list(c) for c in itertools.combinations(live, need)]
+        workers = max(1, min(workers, len(boards) // 100))
+        jobs = [(ints1, ints2, weights, board, boards[w::workers], None, 0, 0) for w in range(workers)]
+    else:
+        workers = max(1, min(workers, trials))
+        jobs = [(ints1, ints2, weights, board, None, live,
+            trials // workers + (w < trials % workers), seed * 1000 + w) for w in range(workers)]
+
+    if workers == 1:
+        results = map(score_boards, jobs)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(score_boards, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    win, tie, total, shares, squares, n = [sum(r[i] for r in results) for i in range(6)]
+    if not total:
+        raise ValueError('no possible matchups')
+    error = 0.0
+    if not exhaustive and n:
+        mean = shares / n
+        error = 100.0 * 1.96 * (max(squares / n - mean * mean, 0.0) / n) ** 0.5
+    lose = total - win - tie
+    return [
+        Equity(100.0 * win / total, 100.0 * tie / total, 100.0 * (win + tie / 2.0) / total, error),
+        Equity(100.0 * lose / total, 100.0 * tie / total, 100.0 * (lose + tie / 2.0) / total, error),
+    ]
+
+
+if __name__ == '__main__':
+
+    """
+    Print the equity of two ranges, with an optional board after a |. Eg.
+
+    python ranges.py "QQ+,AKs" "22+,A2s+" | 2c7sTd
+    """
+
+    import sys
+    args = ' '.join(sys.argv[1:]).split('|')
+    ranges = args[0].split()
+    board = []
+    if len(args) > 1:
+        text = args[1].replace(' ', '')
+        board = [poker.card_from_str(text[i:i+2]) for i in range(0, len(text), 2)]
+
+    print 'BOARD ' + poker.hand_output(board, 5)
+    for r, e in zip(ranges, range_equity(ranges[0], ranges[1], board, seed=0)):
+        print '%-24s win %6.2f%%  tie %6.2f%%  equity %6.2f%% +/- %.2f' % (r, e.win, e.tie, e.equity, e.error)
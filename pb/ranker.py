@@ -0,0 +1,131 @@
+"""
+ranker.py
+
+Bulk hand ranking from the command line, for the quiz (see doc/quiz.md) and
+for scoring big dumps of hands. Deals are read one per line, the hole cards
+of every player then the board after a |, eg.
+
+    Ah Kd | 2c 7s 9h Td Jc
+    Ah Kd Qs Qc 7h 7d | 2c 7s 9h Td Jc
+
+and for each line one line is written: the winning player(s) (counting from
+1), then each player's rank (as hex, lower is better) and hand. Lines that
+can't be read get "error" instead (and blank lines stay blank), so output
+lines always match input lines.
+
+    1       0xa01345 ace high
+    3       0xa01345 ace high       0x922345 pair of queens 0x777734 trip sevens
+
+Input is streamed: lines are read in chunks, ranked by a pool of worker
+processes, and written out in order as they come back, with only a few chunks
+in flight at once, so memory use stays the same however big the input is.
+Throughput is reported on stderr at the end.
+
+    python ranker.py [file] [> ranks.txt]
+"""
+
+import collections
+import itertools
+import multiprocessing
+import sys
+import time
+import poker
+import lookup
+
+# lines per chunk sent to a worker
+CHUNK = 5000
+
+# card mask bit for every way of writing each card, eg. "Ah", "ah", "AH".
+CARD_BITS = {}
+for i, c in enumerate(poker.CARDS):
+    for v in (poker.card_value_sym(c).upper(), poker.card_value_sym(c).lower()):
+        for s in (poker.card_suit_name(c)[0], poker.card_suit_name(c)[0].upper()):
+            CARD_BITS[v + s] = lookup.BITS[i]
+
+
+def rank_line(line):
+    """
+    Rank one deal, returning its output line (without a newline).
+    """
+    try:
+        holes, board = line.rsplit('|', 1)
+        board = board.split()
+        board_mask = 0
+        for c in board:
+            board_mask |= CARD_BITS[c]
+        cards = holes.replace(',', ' ').split()
+        if not cards or len(cards) % 2:
+            raise ValueError
+        # every card seen so far, to catch one given twice anywhere.
+        if bin(board_mask).count('1') != len(board):
+            raise ValueError
+        seen = board_mask
+        out = []
+        for i in range(0, len(cards), 2):
+            a, b = CARD_BITS[cards[i]], CARD_BITS[cards[i + 1]]
+            if a == b or (a | b) & seen:
+                raise ValueError
+            seen |= a | b
+            mask = board_mask | a | b
+            out.append((lookup.rank_mask(mask), mask))
+    except (ValueError, KeyError):
+        return 'error'
+    best = min(r for r, m in out)
+    winners = ','.join(str(i + 1) for i, (r, m) in enumerate(out) if r == best)
+    return winners + '\t' + '\t'.join('0x%06x %s' % (r, poker.rank_desc(r, m)) for r, m in out)
+
+def rank_chunk(lines):
+    """
+    Worker: rank a chunk of lines, returning the output text and how many
+    lines there were.
+    """
+    return ''.join((rank_line(l) if l.strip() else '') + '\n' for l in lines), len(lines)
+
+def chunks(lines, size=CHUNK):
+    while True:
+        chunk = list(itertools.islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+def run(infile, outfile, workers=None):
+    """
+    Rank every line of infile into outfile. Returns the number of lines.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    count = 0
+    if workers == 1:
+        for chunk in chunks(infile):
+            text, n = rank_chunk(chunk)
+            outfile.write(text)
+            count += n
+        return count
+
+    pool = multiprocessing.Pool(workers)
+    pending = collections.deque()
+    try:
+        for chunk in chunks(infile):
+            pending.append(pool.apply_async(rank_chunk, (chunk,)))
+            # keep a couple of chunks per worker in flight, and no more.
+            if len(pending) >= 2 * workers:
+                text, n = pending.popleft().get()
+                outfile.write(text)
+                count += n
+        while pending:
+            text, n = pending.popleft().get()
+            outfile.write(text)
+            count += n
+    finally:
+        pool.close()
+        pool.join()
+    return count
+
+
+if __name__ == '__main__':
+    infile = open(sys.argv[1]) if len(sys.argv) > 1 else sys.stdin
+    start = time.time()
+    count = run(infile, sys.stdout)
+    sys.stdout.flush()
+    elapsed = time.time() - start
+    sys.stderr.write('%d deals in %.2fs (%d deals/s)\n' % (count, elapsed, count / elapsed if elapsed else 0))
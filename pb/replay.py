@@ -0,0 +1,195 @@
+"""
+replay.py
+
+Offline replay and analytics over hand history logs (see history.py). Each log
+file is a shard: shards are replayed in parallel by a process pool, each
+worker building a Summary of its own, and the summaries are added up at the
+end. Nothing is kept per hand, so this runs in constant memory however many
+millions of hands there are.
+
+Every hand is checked against the log as it is replayed: the deck is dealt
+again from the hand's seed (with a Deck, like Game), and the logged
+hole cards and board must match. Hands that reached showdown are scored
+again with the lookup ranker, and the pots are awarded again from those
+ranks (see pot.py); the chips paid must match the log.
+
+The summary has
+    win rates per starting hand class: hands dealt, hands won, net chips
+    showdown frequency
+    per player: hands, VPIP (voluntarily put chips in preflop), PFR (raised
+    preflop), showdowns, net chips
+
+    python replay.py hands.log hands.log.1 ... [> summary.txt]
+"""
+
+import collections
+import multiprocessing
+import poker
+import lookup
+import history
+import pot
+import preflop
+
+# actions that count as voluntarily putting chips in, and as raising.
+VOLUNTARY = frozenset(['call', 'raise', 'allin'])
+RAISES = frozenset(['raise', 'allin'])
+
+# just enough of a Player for pot.award.
+Contender = collections.namedtuple('Contender', 'seat total_bet allin folded rank')
+
+
+class Summary(object):
+    """
+    Running totals over any number of hands. Summaries from different shards
+    are combined with merge.
+    """
+
+    def __init__(self):
+        self.hands = 0
+        self.showdowns = 0
+        # hands that didn't deal again the same, or paid the wrong hands.
+        self.bad_deals = 0
+        self.bad_results = 0
+        # class -> [dealt, won, net chips]
+        self.classes = [[0, 0, 0] for n in range(preflop.CLASSES)]
+        # name -> Counter of hands, vpip, pfr, showdowns, net
+        self.players = collections.defaultdict(collections.Counter)
+        self.deck = poker.Deck()
+
+    def add(self, record):
+        """
+        Replay one HandRecord into the totals.
+        """
+        self.hands += 1
+        seats = record.seats
+
+        # deal it again from the seed: two cards to each seat in order, then
+        # the board.
+        deck = self.deck
+        deck.reset(record.seed)
+        holes = [sorted([deck.next_int(), deck.next_int()]) for s in seats]
+        board = [deck.next_int() for c in record.board]
+        if board != record.board or any(h != sorted(s.cards) for h, s in zip(holes, seats)):
+            self.bad_deals += 1
+
+        put = [0] * len(seats)
+        folded = [False] * len(seats)
+        vpip, pfr = set(), set()
+        preflop_action = True
+        for a in record.actions:
+            if a.action == 'deal':
+                preflop_action = False
+                continue
+            put[a.seat] += a.amount
+            if a.action == 'fold':
+                folded[a.seat] = True
+            elif preflop_action and a.action in VOLUNTARY and a.amount:
+                vpip.add(a.seat)
+                if a.action in RAISES:
+                    pfr.add(a.seat)
+
+        won = [0] * len(seats)
+        for seat, chips in record.results:
+            won[seat] += chips
+
+        # a busted player is still dealt in, but can't win anything.
+        live = [i for i in range(len(seats)) if not folded[i] and put[i]]
+        showdown = len(live) > 1
+        if showdown:
+            self.showdowns += 1
+            board_mask = poker.mask_from_ints(record.board)
+            contenders = [Contender(i, put[i], put[i] == s.stack, folded[i],
+                lookup.rank_mask(board_mask | poker.mask_from_ints(s.cards)))
+                for i, s in enumerate(seats)]
+            paid = [0] * len(seats)
+            for award in pot.award(contenders, lambda c: c.seat):
+                for c, chips in award.winners:
+                    paid[c.seat] += chips
+            if paid != won:
+                self.bad_results += 1
+
+        for i, seat in enumerate(seats):
+            net = won[i] - put[i]
+            stats = self.players[seat.name]
+            stats['hands'] += 1
+            stats['vpip'] += i in vpip
+            stats['pfr'] += i in pfr
+            stats['showdowns'] += showdown and i in live
+            stats['net'] += net
+            if len(seat.cards) == 2:
+                row = self.classes[preflop.hand_class(map(poker.card_from_int, seat.cards))]
+                row[0] += 1
+                row[1] += won[i] > put[i]
+                row[2] += net
+
+    def merge(self, other):
+        self.hands += other.hands
+        self.showdowns += other.showdowns
+        self.bad_deals += other.bad_deals
+        self.bad_results += other.bad_results
+        for row, more in zip(self.classes, other.classes):
+            for n in range(len(row)):
+                row[n] += more[n]
+        for name, stats in other.players.items():
+            self.players[name].update(stats)
+
+    def table(self):
+        """
+        The summary as lines of text, one table after another.
+        """
+        pct = lambda a, b: 100.0 * a / b if b else 0.0
+        lines = [
+            'hands %d, showdown %.1f%%, bad deals %d, bad results %d' % (
+                self.hands, pct(self.showdowns, self.hands), self.bad_deals, self.bad_results),
+            '',
+            '%-16s %8s %7s %7s %7s %10s' % ('player', 'hands', 'vpip', 'pfr', 'wsd', 'net'),
+        ]
+        for name, s in sorted(self.players.items(), key=lambda i: -i[1]['net']):
+            lines.append('%-16s %8d %6.1f%% %6.1f%% %6.1f%% %10d' % (name, s['hands'],
+                pct(s['vpip'], s['hands']), pct(s['pfr'], s['hands']),
+                pct(s['showdowns'], s['hands']), s['net']))
+        lines += ['', '%-5s %8s %7s %10s' % ('hand', 'dealt', 'won', 'net/hand')]
+        order = sorted(range(preflop.CLASSES), key=lambda n: -pct(self.classes[n][2], self.classes[n][0]))
+        for n in order:
+            dealt, wins, net = self.classes[n]
+            if dealt:
+                lines.append('%-5s %8d %6.1f%% %10.2f' % (preflop.class_name(n), dealt,
+                    pct(wins, dealt), float(net) / dealt))
+        return lines
+
+
+def replay_shard(path):
+    """
+    Worker: replay every hand in one log file.
+    """
+    summary = Summary()
+    for record in history.read(path):
+        summary.add(record)
+    return summary
+
+def replay(paths, workers=None):
+    """
+    Replay any number of log files in parallel, and return their combined
+    Summary.
+    """
+    summary = Summary()
+    if workers == 1 or len(paths) == 1:
+        results = (replay_shard(p) for p in paths)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(replay_shard, paths)
+        pool.close()
+    for result in results:
+        summary.merge(result)
+    return summary
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    start = time.time()
+    summary = replay(sys.argv[1:])
+    for line in summary.table():
+        print line
+    elapsed = time.time() - start
+    sys.stderr.write('%d hands in %.2fs (%d hands/s)\n' % (summary.hands, elapsed, summary.hands / elapsed))
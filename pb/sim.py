@@ -0,0 +1,129 @@
+"""
+sim.py
+
+Headless bot vs bot simulation, for load testing the game engine. Bots are
+plugged straight into each table's play() coroutine: whenever a table waits
+on a player, the bot for that seat picks a command and it is sent in. There
+is no output, and the pause between hands is skipped, so tables run as fast
+as the engine allows.
+
+Time is split by phase (dealing, drawing the board, betting and showdown),
+and the report has hands per second and peak memory use.
+
+    python sim.py [tables] [hands per table] [bot] [seed]
+"""
+
+import random
+import resource
+import time
+import game
+
+PHASES = ['deal', 'draw', 'showdown']
+
+
+def random_bot(g, p, rng):
+    return rng.choice(['call', 'call', 'call', 'fold'])
+
+def calling_bot(g, p, rng):
+    return 'call'
+
+def tight_bot(g, p, rng):
+    """
+    Plays only good starting hands, and after the flop keeps going with a
+    pair or better.
+    """
+    if not g.board:
+        a, b = p.cards
+        if a.value == b.value or a.value + b.value >= 21:
+            return 'call'
+        return g.timeout_command()
+    if p.rank < 0x900000:
+        return 'call'
+    return g.timeout_command()
+
+BOTS = {
+    'random': random_bot,
+    'calling': calling_bot,
+    'tight': tight_bot,
+}
+
+
+class Timed(object):
+    """
+    Wraps a Game method, adding up the time spent in it.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.total = 0.0
+
+    def __call__(self, *args):
+        start = time.time()
+        try:
+            return self.fn(*args)
+        finally:
+            self.total += time.time() - start
+
+
+def simulate(tables=10, hands=1000, bot=random_bot, seed=0):
+    """
+    Play hands hands at each of tables tables, taking turns between tables
+    one command at a time. Returns a dict of results.
+    """
+    rng = random.Random(seed)
+    random.seed(seed)
+    timers = dict((phase, []) for phase in PHASES)
+    running = []
+    for t in range(tables):
+        g = game.Game()
+        g.output = lambda msg, urgent: None
+        for phase in PHASES:
+            timer = Timed(getattr(g, phase))
+            setattr(g, phase, timer)
+            timers[phase].append(timer)
+        loop = g.play()
+        running.append([g, loop, loop.send(None), 0])
+
+    played = 0
+    start = time.time()
+    while running:
+        for table in list(running):
+            g, loop, wait, count = table
+            if wait:
+                count += 1
+                played += 1
+                if count >= hands:
+                    loop.close()
+                    running.remove(table)
+                    continue
+                wait = loop.send(None)
+            else:
+                wait = loop.send(bot(g, g.players[g.action], rng))
+            table[2:] = [wait, count]
+    elapsed = time.time() - start
+
+    phases = dict((phase, sum(t.total for t in timers[phase])) for phase in PHASES)
+    phases['betting'] = elapsed - sum(phases.values())
+    return {
+        'hands': played,
+        'seconds': elapsed,
+        'hands_per_second': played / elapsed,
+        'phases': phases,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    args = sys.argv[1:]
+    tables = int(args[0]) if len(args) > 0 else 10
+    hands = int(args[1]) if len(args) > 1 else 1000
+    bot = BOTS[args[2]] if len(args) > 2 else random_bot
+    seed = int(args[3]) if len(args) > 3 else 0
+
+    r = simulate(tables, hands, bot, seed)
+    print '%d hands at %d tables in %.2fs, %.0f hands/s' % (r['hands'], tables, r['seconds'], r['hands_per_second'])
+    for phase in ['deal', 'draw', 'betting', 'showdown']:
+        t = r['phases'][phase]
+        print '  %-9s %8.3fs %5.1f%% %7.1fus/hand' % (phase, t, 100 * t / r['seconds'], 1e6 * t / r['hands'])
+    print 'max rss %d kB' % r['max_rss_kb']
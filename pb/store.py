@@ -0,0 +1,143 @@
+"""
+store.py
+
+Persistent player bankrolls, kept in SQLite. Players are loaded the first
+time they sit, and stay in memory while they play (and a while after, up to
+cache_size players), so the game only ever touches Player objects. A Player
+holds the state of their seat too (cards, bets...), so one player can only
+sit at one table at a time, see held().
+
+Stacks are written behind: the game changes player.stack as it likes, and at
+the end of every hand the players at the table are handed to hand_done. Their
+stacks are appended to a small batch file next to the database (no fsync, so
+this costs next to nothing), and every batch hands they are committed to the
+database in one transaction, and the batch file emptied. If the bot dies
+between commits, the stacks still in the batch file are committed when the
+store is next opened. Stacks are stored whole, not as changes, so replaying a
+batch twice does no harm.
+"""
+
+import collections
+import os
+import sqlite3
+import player
+
+SCHEMA = 'CREATE TABLE IF NOT EXISTS players (name TEXT PRIMARY KEY, stack INTEGER NOT NULL)'
+SAVE = 'INSERT OR REPLACE INTO players (name, stack) VALUES (?, ?)'
+
+# what a new player starts with.
+BUY_IN = 1000
+
+
+class PlayerStore(object):
+
+    def __init__(self, path, batch=20, cache_size=1000):
+        self.db = sqlite3.connect(path)
+        self.db.execute(SCHEMA)
+        self.batch = batch
+        self.cache_size = cache_size
+        # name -> Player, least recently used first.
+        self.cache = collections.OrderedDict()
+        # times each cached player is loaded and not yet released.
+        self.refs = collections.Counter()
+        # name -> stack, for everything in the batch file.
+        self.dirty = {}
+        self.hands = 0
+
+        self.batch_path = path + '-batch'
+        self.recover()
+        self.batch_file = open(self.batch_path, 'a')
+
+    def recover(self):
+        """
+        Commit whatever is left in the batch file from last time.
+        """
+        if not os.path.exists(self.batch_path):
+            return
+        with open(self.batch_path) as f:
+            for line in f:
+                # the last line may be cut short by a crash.
+                if not line.endswith('\n'):
+                    break
+                name, stack = line.decode('utf-8').rstrip('\n').rsplit('\t', 1)
+                self.dirty[name] = int(stack)
+        self.commit()
+        open(self.batch_path, 'w').close()
+
+    def load(self, name):
+        """
+        A player's Player, from memory if they're already loaded. Every load
+        should be matched by a release once the player leaves the table.
+        """
+        p = self.cache.pop(name, None)
+        if p is None:
+            p = player.Player(name)
+            row = self.db.execute('SELECT stack FROM players WHERE name = ?', (name,)).fetchone()
+            p.stack = row[0] if row else BUY_IN
+        self.cache[name] = p
+        self.refs[name] += 1
+        return p
+
+    def held(self, name):
+        """
+        Whether a player is loaded and not yet released, ie. sitting at a
+        table somewhere.
+        """
+        return name in self.refs
+
+    def release(self, p):
+        if self.cache.get(p.name) is not p:
+            return
+        self.refs[p.name] -= 1
+        if self.refs[p.name] <= 0:
+            del self.refs[p.name]
+
+    def hand_done(self, players):
+        """
+        Note the stacks of everyone at a table at the end of a hand. Players
+        that didn't come from the store (the house players) aren't kept.
+        """
+        for p in players:
+            if self.cache.get(p.name) is not p:
+                continue
+            self.dirty[p.name] = p.stack
+            self.batch_file.write((u'%s\t%d\n' % (p.name, p.stack)).encode('utf-8'))
+        self.batch_file.flush()
+        self.hands += 1
+        if self.hands >= self.batch:
+            self.flush()
+
+    def commit(self):
+        if self.dirty:
+            with self.db:
+                self.db.executemany(SAVE, self.dirty.items())
+            self.dirty = {}
+
+    def flush(self):
+        """
+        Commit the batch to the database, and start a new one.
+        """
+        self.commit()
+        self.batch_file.seek(0)
+        self.batch_file.truncate()
+        self.hands = 0
+        self.evict()
+
+    def evict(self):
+        """
+        Forget the least recently used players nobody is holding, once there
+        are too many in memory.
+        """
+        extra = len(self.cache) - self.cache_size
+        for name in list(self.cache):
+            if extra <= 0:
+                break
+            if name not in self.refs:
+                del self.cache[name]
+                extra -= 1
+
+    def close(self):
+        self.flush()
+        self.batch_file.close()
+        os.remove(self.batch_path)
+        self.db.close()
@@ -0,0 +1,132 @@
+"""
+tables.py
+
+Run many games at once in one process. Each table is a Game whose play()
+coroutine is driven from the irc event loop: player commands are routed to
+the right table by its id (usually the channel), the pause between hands is a
+timer instead of a sleep, and a player who takes too long to act is checked
+or folded by another timer. Nothing ever blocks, so one slow table can't hold
+up the others.
+
+Only the player in action can act, and only with a command the game knows,
+so chatter in the channel never moves the game along. A table whose game
+raises is closed, and the others carry on.
+"""
+
+import traceback
+import irc
+import game
+import metrics
+
+# seconds a player has to act before they are checked or folded.
+ACTION_TIMEOUT = 60
+
+
+class Table(object):
+    """
+    A game and the state needed to drive its coroutine.
+    """
+
+    def __init__(self, table_id, game):
+        self.id = table_id
+        self.game = game
+        self.loop = game.play()
+        # True while the game is waiting for a player command, False while it
+        # is pausing between hands.
+        self.waiting = False
+        self.timer = None
+
+
+class TableManager(object):
+    """
+    Hosts any number of tables, keyed by id.
+
+    output is a function taking (table id, line, urgent), used for all game
+    output.
+    """
+
+    def __init__(self, output, timeout=ACTION_TIMEOUT):
+        self.output = output
+        self.timeout = timeout
+        self.tables = {}
+
+    def open(self, table_id, table_game=None):
+        """
+        Start a new game at a table.
+        """
+        if table_id in self.tables:
+            return self.tables[table_id]
+        table_game = table_game or game.Game()
+        table_game.output = lambda msg, urgent: self.output(table_id, msg, urgent)
+        table_game.table = table_id
+        table = self.tables[table_id] = Table(table_id, table_game)
+        self.advance(table, None)
+        return table
+
+    def close(self, table_id):
+        table = self.tables.pop(table_id, None)
+        if table:
+            if table.timer:
+                irc.cancel(table.timer)
+            table.loop.close()
+
+    def command(self, table_id, nick, text):
+        """
+        Route a player command to its table. Game commands for unknown tables,
+        between hands, from anyone but the player in action, or that aren't
+        game commands at all, are ignored.
+        """
+        table = self.tables.get(table_id)
+        if not table:
+            return
+        # sitting and standing can happen any time, and take effect from the
+        # next hand. anyone can ask for their outs, or the bot's stats, any
+        # time too.
+        if text == 'sit':
+            table.game.sit(nick)
+            return
+        if text == 'stand':
+            table.game.stand(nick)
+            return
+        if text == 'outs':
+            table.game.show_outs(nick)
+            return
+        if text == 'stats':
+            for line in metrics.summary():
+                self.output(table_id, line, False)
+            return
+        if not table.waiting or not table.game.in_action(nick):
+            return
+        if not table.game.valid(table.game.players[table.game.action], text):
+            return
+        table.game.parse(text)
+        self.advance(table, text)
+
+    def advance(self, table, cmd):
+        """
+        Send a command (or None) into a table's coroutine, and set a timer for
+        whatever it's waiting on next.
+        """
+        if table.timer:
+            irc.cancel(table.timer)
+            table.timer = None
+        try:
+            wait = table.loop.send(cmd)
+        except Exception:
+            # a bug in this game, don't take every other table down with it.
+            traceback.print_exc()
+            self.close(table.id)
+            return
+        if wait:
+            table.waiting = False
+            table.timer = irc.call_later(wait, self.advance, table, None)
+        else:
+            table.waiting = True
+            table.timer = irc.call_later(self.timeout, self.expire, table)
+
+    def expire(self, table):
+        """
+        The player in action ran out of time.
+        """
+        table.timer = None
+        self.advance(table, table.game.timeout_command())
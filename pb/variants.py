@@ -0,0 +1,71 @@
+"""
+variants.py
+
+The games Game can run. A variant says how many cards each player is dealt,
+the rounds of the hand, and how hands are ranked and described.
+
+Each round first deals board cards or lets players draw (swap up to some
+number of their cards for new ones), then has a betting round:
+
+    Round(name, board, draw)    board cards dealt, and most cards a player
+                                can draw this round
+
+Ranks always follow the hand_build layout, lower is better, so the showdown
+and pots work the same for every variant.
+"""
+
+import collections
+import poker
+import lookup
+import lowball
+
+Round = collections.namedtuple('Round', 'name board draw')
+
+
+class Variant(object):
+
+    def __init__(self, name, title, hole, rounds, rank, describe, high=True):
+        """
+        rank takes a card mask and returns its rank, describe takes a rank
+        and mask and returns a description. high variants build winning hands
+        with hand_build, the others show the player's whole hand.
+        """
+        self.name = name
+        self.title = title
+        self.hole = hole
+        self.rounds = rounds
+        self.rank = rank
+        self.describe = describe
+        self.high = high
+        # cards shown for the board in the topic.
+        self.board_size = sum(r.board for r in rounds)
+
+    def hand(self, rank, cards):
+        """
+        The winning Hand for a player's cards (hole cards and board).
+        """
+        if self.high:
+            return poker.Hand(rank, source=cards)
+        return poker.Hand(rank, sorted(cards, key=lambda c: c.value, reverse=True),
+            self.describe(rank, poker.mask_from_cards(cards)))
+
+
+HOLDEM = Variant('holdem', 'NLHE', 2, [
+    Round('PREFLOP', 0, 0),
+    Round('FLOP', 3, 0),
+    Round('TURN', 1, 0),
+    Round('RIVER', 1, 0),
+], lookup.rank_mask, poker.rank_desc)
+
+DRAW_ROUNDS = [
+    Round('PREDRAW', 0, 0),
+    Round('DRAW', 0, 5),
+]
+
+FIVE_CARD_DRAW = Variant('draw', 'NL5CD', 5, DRAW_ROUNDS, lookup.rank_mask, poker.rank_desc)
+
+DEUCE_SEVEN = Variant('27', 'NL2-7', 5, DRAW_ROUNDS, lowball.rank_27_mask, lowball.desc_27, high=False)
+
+ACE_FIVE = Variant('a5', 'NLA-5', 5, DRAW_ROUNDS, lowball.rank_a5_mask, lowball.desc_a5, high=False)
+
+VARIANTS = dict((v.name, v) for v in [HOLDEM, FIVE_CARD_DRAW, DEUCE_SEVEN, ACE_FIVE])
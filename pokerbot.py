@@ -1,8 +1,100 @@
+import time
 from pb import game
+from pb import history
+from pb import irc
+from pb import metrics
+from pb import outq
+from pb import preflop
+from pb import store
+from pb import tables
+from pb import variants
+
+def play_console(game):
+    game_loop = game.play()    
+    wait = game_loop.send(None)
+    while True:
+        if wait:
+            time.sleep(wait)
+            wait = game_loop.send(None)
+            continue
+        try:
+            cmd = raw_input()
+        except EOFError:
+            return
+        if cmd == 'quit':
+            return
+        game.parse(cmd)
+        wait = game_loop.send(cmd)
+
+def new_game(options):
+    """
+    A game of the variant set in the options, logging its hands if a history
+    file is set, keeping bankrolls if a player store is, and calling the odds
+    on preflop all-ins if a preflop table is.
+    """
+    if options.has_option('store', 'path') and not hasattr(new_game, 'store'):
+        new_game.store = store.PlayerStore(options.get('store', 'path'),
+            options.getint('store', 'batch'))
+    variant = 'holdem'
+    if options.has_option('game', 'variant'):
+        variant = options.get('game', 'variant')
+    g = game.Game(store=getattr(new_game, 'store', None), variant=variants.VARIANTS[variant])
+    if options.has_option('history', 'path'):
+        # tables all share one writer, they never write at the same time.
+        if not hasattr(new_game, 'writer'):
+            new_game.writer = history.HistoryWriter(options.get('history', 'path'))
+            new_game.writer.keep_synced()
+        g.history = new_game.writer
+    if options.has_option('preflop', 'path'):
+        g.preflop = preflop.load(options.get('preflop', 'path'))
+    return g
+
+def shutdown():
+    """
+    Get everything buffered onto disk before exiting.
+    """
+    if hasattr(new_game, 'writer'):
+        new_game.writer.close()
+    if hasattr(new_game, 'store'):
+        new_game.store.close()
+
+def play_irc(options):
+    """
+    Play in irc channels, one table per channel. Everything said in a channel
+    is routed to that channel's game, and game output is said back to it.
+    """
+    channels = [c.strip() for c in options.get('irc', 'channel').split(',')]
+    conn = irc.Connection(
+        options.get('irc', 'host'),
+        options.getint('irc', 'port'),
+        options.get('irc', 'nick'),
+        channels)
+    queue = outq.OutQueue(
+        lambda channel, msg: conn.privmsg(channel, msg.encode('utf-8')),
+        options.getfloat('irc', 'rate'),
+        options.getint('irc', 'burst'))
+    manager = tables.TableManager(queue.put, options.getint('irc', 'timeout'))
+    metrics.watch(queue)
+    if options.has_option('irc', 'stats_interval'):
+        queue.log_every(options.getint('irc', 'stats_interval'))
+
+    def on_ready():
+        # tables keep running across reconnects, this only opens new ones.
+        for channel in channels:
+            if channel not in manager.tables:
+                manager.open(channel, new_game(options))
+
+    conn.on_ready = on_ready
+    conn.on_message = lambda nick, target, text: manager.command(target, nick, text)
+    if options.has_section('metrics') and options.getboolean('metrics', 'enabled'):
+        metrics.dump_every(options.get('metrics', 'dump'), options.getint('metrics', 'interval'))
+    conn.connect_server()
+    irc.loop()
 
 if __name__ == '__main__':
     import sys
     import random
+    import ConfigParser
     
     if len(sys.argv) > 1:
         seed = int(sys.argv[-1])
@@ -11,13 +103,24 @@ if __name__ == '__main__':
         
     random.seed(seed)
     print 'seed %d' % seed
+
+    options = ConfigParser.SafeConfigParser()
+    options.read('options.ini')
+
+    if options.has_section('metrics'):
+        if options.getboolean('metrics', 'enabled'):
+            metrics.enable()
+        if options.getint('metrics', 'profile_hands'):
+            metrics.profile(options.getint('metrics', 'profile_hands'), options.get('metrics', 'profile_path'))
     
-    game = game.Game()        
-    game_loop = game.play()    
-    game_loop.send(None)
-    while True:
-        cmd = raw_input()
-        game.parse(cmd)
-        game_loop.send(cmd)
-        
-    
+    # map the preflop table now, so a bad path shows up straight away.
+    if options.has_option('preflop', 'path'):
+        preflop.load(options.get('preflop', 'path'))
+
+    try:
+        if options.has_section('irc') and options.getboolean('irc', 'enabled'):
+            play_irc(options)
+        else:
+            play_console(new_game(options))
+    finally:
+        shutdown()